@@ -0,0 +1,233 @@
+"""Admission control and per-user rate limits for the LLM-backed chat routes.
+
+Each model provider gets a concurrency limit and a bounded wait queue.
+Waiters are served by lane - distress messages first, then child chats,
+then parent chats, then background work such as conversation summaries -
+and a full queue sheds its newest lower-priority waiter to make room for a
+higher-priority request. Every user also has a token bucket per lane.
+Distress messages get a larger bucket than ordinary chats, so a child in
+trouble is not turned away but the top lane cannot be used to skip the
+limit; background work is never rate limited.
+
+Rejections are fast: 429 when a user is over their rate, 503 when the
+provider queue is full or the wait times out, both with Retry-After.
+"""
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from fastapi import HTTPException
+import metrics
+
+# Lower is served first
+LANES = {"distress": 0, "child": 1, "parent": 2, "background": 3}
+UNLIMITED_LANES = {"background"}
+
+# provider -> (max concurrent generations, max waiting requests)
+PROVIDER_LIMITS = {"gemini": (16, 64), "huggingface": (8, 32)}
+LLM_MAX_CONCURRENCY = os.getenv("LLM_MAX_CONCURRENCY")
+LLM_QUEUE_SIZE = os.getenv("LLM_QUEUE_SIZE")
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+CHAT_RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", "20"))
+CHAT_RATE_BURST = float(os.getenv("CHAT_RATE_BURST", "5"))
+# Messages flagged as distress are limited separately, and more generously
+DISTRESS_RATE_PER_MINUTE = float(os.getenv("DISTRESS_RATE_PER_MINUTE", "60"))
+DISTRESS_RATE_BURST = float(os.getenv("DISTRESS_RATE_BURST", "15"))
+RATE_LIMIT_USERS = 10000
+
+
+def _overloaded(detail="Chat is busy right now, please try again shortly"):
+    return HTTPException(status_code=503, detail=detail,
+                         headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+
+
+class Slot:
+    """A held generation slot; release() is idempotent"""
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "lane", "future", "enqueued_at")
+
+    def __init__(self, priority, seq, lane, future):
+        self.priority = priority
+        self.seq = seq
+        self.lane = lane
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionController:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout=LLM_QUEUE_TIMEOUT):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self.admitted = Counter()
+        self.rejected = Counter()  # reason -> count
+        self.max_wait_ms = 0.0
+        self._total_wait_ms = 0.0
+        self._waited = 0
+
+    async def acquire(self, lane):
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self.admitted[lane] += 1
+            return Slot(self)
+
+        priority = LANES[lane]
+        if len(self._waiters) >= self.max_queue:
+            victim = max((w for w in self._waiters if w.priority > priority),
+                         key=lambda w: (w.priority, w.seq), default=None)
+            if victim is None:
+                self.rejected["queue_full"] += 1
+                raise _overloaded()
+            self._waiters.remove(victim)
+            self.rejected["shed"] += 1
+            victim.future.set_exception(_overloaded())
+
+        waiter = _Waiter(priority, next(self._seq), lane, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._waiters.remove(waiter)
+                waiter.future.cancel()
+                self.rejected["timeout"] += 1
+                raise _overloaded()
+            # Granted just as the wait timed out - keep the slot
+        except BaseException:
+            # Caller cancelled (client went away): give up the place or the slot
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                waiter.future.cancel()
+            elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self._release()
+            raise
+        waiter.future.result()  # re-raises if shed
+
+        wait_ms = (time.perf_counter() - waiter.enqueued_at) * 1000
+        self._waited += 1
+        self._total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.admitted[lane] += 1
+        return Slot(self)
+
+    def _release(self):
+        if self._waiters:
+            # Hand the slot straight to the next waiter, best lane first
+            waiter = min(self._waiters, key=lambda w: (w.priority, w.seq))
+            self._waiters.remove(waiter)
+            waiter.future.set_result(None)
+        else:
+            self._active -= 1
+
+    def stats(self):
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": len(self._waiters),
+            "queue_capacity": self.max_queue,
+            "queued_by_lane": dict(Counter(w.lane for w in self._waiters)),
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+            "avg_wait_ms": round(self._total_wait_ms / self._waited, 2) if self._waited else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+        }
+
+
+class RateLimiter:
+    """Token bucket per key and lane, refilled continuously at rate_per_minute.
+
+    lane_limits maps a lane to its own (rate_per_minute, burst).
+    """
+
+    def __init__(self, rate_per_minute=CHAT_RATE_PER_MINUTE, burst=CHAT_RATE_BURST,
+                 max_keys=RATE_LIMIT_USERS, lane_limits=None):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.lane_limits = {lane: (per_minute / 60, lane_burst)
+                            for lane, (per_minute, lane_burst) in (lane_limits or {}).items()}
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self.limited = Counter()
+
+    def check(self, key, lane):
+        """0 if the request may proceed, otherwise seconds until it may"""
+        rate, burst = self.lane_limits.get(lane, (self.rate, self.burst))
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop((key, lane), (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+            self.limited[lane] += 1
+        self._buckets[(key, lane)] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+_controllers = {}
+rate_limiter = RateLimiter(lane_limits={"distress": (DISTRESS_RATE_PER_MINUTE, DISTRESS_RATE_BURST)})
+
+
+def controller_for(provider):
+    controller = _controllers.get(provider)
+    if controller is None:
+        max_concurrent, max_queue = PROVIDER_LIMITS.get(provider, (8, 32))
+        controller = _controllers[provider] = AdmissionController(
+            provider,
+            int(LLM_MAX_CONCURRENCY or max_concurrent),
+            int(LLM_QUEUE_SIZE or max_queue)
+        )
+    return controller
+
+
+async def acquire(user_id, lane, provider):
+    """Rate-limit the user, then wait for a generation slot on the provider.
+
+    Raises HTTPException 429 or 503 (with Retry-After) instead of queueing
+    without bound. Use the returned Slot as a context manager or release() it.
+    """
+    if lane not in UNLIMITED_LANES:
+        retry_after = rate_limiter.check(user_id, lane)
+        if retry_after:
+            raise HTTPException(status_code=429, detail="Too many chat messages, please slow down",
+                                headers={"Retry-After": str(math.ceil(retry_after))})
+    return await controller_for(provider).acquire(lane)
+
+
+def admission_stats():
+    return {
+        "providers": {name: controller.stats() for name, controller in _controllers.items()},
+        "rate_limited": dict(rate_limiter.limited),
+        "tracked_buckets": len(rate_limiter._buckets),
+    }
+
+
+metrics.register("admission", admission_stats)
@@ -1,126 +1,295 @@
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_huggingface import HuggingFacePipeline
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 import asyncio
+from lazy import LazyResource, ResourceFailed
+from semantic_cache import SemanticCache, normalize_query
+from embedding_service import EmbeddingService
+from retrieval import EMBED_TIMEOUT, HybridRetriever, retrieval_stats, run_stage
+from lexical_index import LEXICAL_INDEX_FILE, BM25Index
+from distress import detect_distress, detector as distress_detector
+from llm_router import ProviderRouter
+from conversation_memory import ConversationMemory, estimate_tokens, format_transcript
+from context_assembly import RAG_CONTEXT_CANDIDATES, context_assembler
+import admission
+import metrics
+import tracing
 
 # Configuration - Choose your model
-MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "gemini")  # "gemini" or "huggingface"
+MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "gemini")  # "gemini", "huggingface" or "fake" (offline)
+# Optional second provider for failover and hedged requests, e.g. "huggingface" or "fake"
+LLM_FALLBACK_PROVIDER = os.getenv("LLM_FALLBACK_PROVIDER", "")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 HF_API_KEY = os.getenv("HUGGINGFACE_API_KEY", "")
+# Age the child prompt is pitched at when the account has none
+DEFAULT_CHILD_AGE = 15
 
 
 # Initialize LLM based on provider
-def get_llm():
-    if MODEL_PROVIDER == "gemini":
+# Provider SDKs are imported inside the factories: they take seconds to import
+def get_llm(provider=None):
+    provider = provider or MODEL_PROVIDER
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         return ChatGoogleGenerativeAI(
             model="gemini-2.5-flash-lite",
             temperature=0.5
         )
+    elif provider == "fake":
+        from fake_llm import get_fake_llm
+
+        # Canned replies with simulated latency, for load tests and offline development
+        return get_fake_llm()
     else:  # huggingface
+        from langchain_huggingface import HuggingFacePipeline
+        from generation_scheduler import batched_pipeline_llm
+
         LOCAL_MODEL_ID = "google/gemma-3-270m-it"
 
-        return HuggingFacePipeline.from_model_id(
+        # Concurrent chats are queued and generated in padded batches on one worker
+        return batched_pipeline_llm(HuggingFacePipeline.from_model_id(
             model_id=LOCAL_MODEL_ID,
             task="text-generation",
             pipeline_kwargs={
                 "max_new_tokens": 400,
                 "temperature": 0.7
-            })
+            }))
 
 
-llm = get_llm()
-
 # Initialize RAG components
-def get_vectorstore():
-    """Load the existing vector store"""
-    persist_dir = "./vectorstore"
-    collection_name = "CGM_Agent"
+PERSIST_DIR = "./vectorstore"
+COLLECTION_NAME = "CGM_Agent"
+# Touched by build_vector_db.py after every rebuild
+BUILD_MARKER = os.path.join(PERSIST_DIR, ".build_id")
 
-    embeddings = HuggingFaceEmbeddings(
+
+def get_embeddings():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
         model_name="sentence-transformers/all-MiniLM-L6-v2",
         model_kwargs={'device': 'cpu'},
         encode_kwargs={'normalize_embeddings': True}
     )
 
+
+def get_vectorstore():
+    """Load the existing vector store"""
+    from langchain_community.vectorstores import Chroma
+
     vectorstore = Chroma(
-        persist_directory=persist_dir,
-        embedding_function=embeddings,
-        collection_name=collection_name
+        persist_directory=PERSIST_DIR,
+        embedding_function=embeddings_provider.get(),
+        collection_name=COLLECTION_NAME
     )
 
     return vectorstore
 
 
-# Load vector store once
-try:
+def get_lexical_index(vectorstore):
+    """BM25 index saved by build_vector_db.py, or rebuilt from the vector store"""
+    path = os.path.join(PERSIST_DIR, LEXICAL_INDEX_FILE)
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    return BM25Index.from_vectorstore(vectorstore)
+
+
+def get_retriever():
+    """Vector store and BM25 index plus the off-loop search wrapper, built once"""
     vectorstore = get_vectorstore()
-    print("✓ Vector store loaded successfully")
-except Exception as e:
-    print(f"Warning: Could not load vector store: {e}")
-    vectorstore = None
+    return HybridRetriever(vectorstore, get_lexical_index(vectorstore))
+
+
+def vectorstore_build_id():
+    """Changes whenever the vector store is rebuilt (None if never built)"""
+    try:
+        return os.stat(BUILD_MARKER).st_mtime_ns
+    except OSError:
+        return None
+
+
+# Built on first use, or ahead of time by warm_up() from the API lifespan
+llm_provider = LazyResource("llm", get_llm)
+fallback_llm_provider = (LazyResource("llm_fallback", lambda: get_llm(LLM_FALLBACK_PROVIDER))
+                         if LLM_FALLBACK_PROVIDER and LLM_FALLBACK_PROVIDER != MODEL_PROVIDER else None)
+embeddings_provider = LazyResource("embeddings", get_embeddings)
+retriever_provider = LazyResource("vectorstore", get_retriever)
+
+# Batches concurrent query embeddings and caches repeats
+embedding_service = EmbeddingService(embeddings_provider.get)
+metrics.register("embeddings", embedding_service.stats)
+metrics.register("retrieval", retrieval_stats)
+metrics.register("context_assembly", context_assembler.stats)
+
+# Every generation goes through the router: deadlines, circuit breakers, failover and hedging
+llm_router = ProviderRouter(
+    {MODEL_PROVIDER: llm_provider.aget,
+     **({LLM_FALLBACK_PROVIDER: fallback_llm_provider.aget} if fallback_llm_provider else {})}
+)
+metrics.register("llm_router", llm_router.metrics)
+metrics.register("distress", distress_detector.stats)
+
+# Parent answers keyed on the question and its embedding
+parent_cache = SemanticCache(
+    threshold=float(os.getenv("PARENT_CACHE_THRESHOLD", "0.92")),
+    max_entries=int(os.getenv("PARENT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("PARENT_CACHE_TTL", "86400"))
+)
+_parent_cache_build_id = vectorstore_build_id()
+metrics.register("parent_cache", parent_cache.stats)
+
+
+def warm_up():
+    """Start loading the LLM and vector store in the background"""
+    llm_provider.warm()
+    if fallback_llm_provider:
+        fallback_llm_provider.warm()
+    retriever_provider.warm()
+
+
+def ai_status():
+    """Load state of the LLM and the optional RAG components"""
+    return {
+        "llm": llm_provider.status(),
+        "embeddings": embeddings_provider.status(),
+        "vectorstore": retriever_provider.status()
+    }
+
 
+async def get_retriever_or_none():
+    """The retriever, or None if the vector store cannot be loaded (chat then runs without RAG)"""
+    try:
+        return await retriever_provider.aget()
+    except ResourceFailed:
+        # Already reported when the load failed; retried once the backoff has passed
+        return None
+    except Exception as e:
+        print(f"Warning: Could not load vector store: {e}")
+        return None
 
-async def child_chatbot(message: str, age: int = 15):
-    """Child-friendly chatbot with safety education"""
 
+def response_text(response):
+    """Extract text from a chat model message or a plain LLM string"""
+    if hasattr(response, 'content'):
+        return response.content
+    return str(response)
+
+
+async def generate(prompt, inputs):
+    """Format the prompt and get a complete reply through the provider router"""
+    with tracing.span("prompt.format"):
+        prompt_value = await prompt.ainvoke(inputs)
+    with tracing.span("llm.generate", stream=False):
+        return await llm_router.ainvoke(prompt_value)
+
+
+async def generate_stream(prompt, inputs):
+    """Format the prompt and stream reply chunks through the provider router"""
+    with tracing.span("prompt.format"):
+        prompt_value = await prompt.ainvoke(inputs)
+    # Ended explicitly rather than entered: the consumer's spans should not nest under them
+    generation = tracing.span("llm.generate", stream=True)
+    first_token = tracing.span("llm.first_token")
+    chunks = 0
+    error = None
+    try:
+        async for chunk in llm_router.astream(prompt_value):
+            if not chunks:
+                first_token.end()
+            chunks += 1
+            yield chunk
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        first_token.end(error)
+        generation.set(chunks=chunks)
+        generation.end(error)
+
+
+def child_prompt(message: str, age: int = DEFAULT_CHILD_AGE):
+    """Child chat prompt and the tokens it uses before any history"""
     system_prompt = f"""You are a friendly, caring virtual friend for children aged around {age} years.
     Teach them about good touch/bad touch, personal safety, and saying no.
     Use simple language, emojis, and be encouraging.
     If you detect distress, suggest talking to a trusted adult.
     Keep responses short and age-appropriate."""
 
-    # Create chat prompt
-    prompt = ChatPromptTemplate.from_messages([
+    # Create chat prompt; earlier turns go in as messages, not template text
+    return ChatPromptTemplate.from_messages([
         ("system", system_prompt),
-        ("human", f"{message}")
+        MessagesPlaceholder("history", optional=True),
+        ("human", "{message}")
+    ]), estimate_tokens(system_prompt) + estimate_tokens(message)
+
+
+async def summarize_conversation(summary: str, turns):
+    """Fold chat turns (oldest first) into the running conversation summary"""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """Update the summary of a conversation between a child and a safety-education assistant.
+    Keep what matters for continuing the conversation: topics covered, questions asked,
+    anything the child said about feeling unsafe. Reply with the summary only, in under 150 words."""),
+        ("human", "Current summary:\n{summary}\n\nNew conversation turns:\n{transcript}")
     ])
+    # Counts against the model's concurrency limit, behind every chat request
+    with await admission.acquire(None, "background", MODEL_PROVIDER):
+        response = await generate(prompt, {"summary": summary or "(none)", "transcript": format_transcript(turns)})
+    return response_text(response)
 
-    # Run chain
-    chain = prompt | llm
-    response = await chain.ainvoke({"message": message})
 
-    # Extract text from response
-    if hasattr(response, 'content'):
-        response_text = response.content
-    else:
-        response_text = str(response)
+# Recent child chat turns plus a stored rolling summary of older ones
+conversation_memory = ConversationMemory(summarize_conversation)
+metrics.register("conversation_memory", conversation_memory.stats)
+
+
+async def child_chain_input(message: str, age: int, user_id):
+    with tracing.span("prompt.assemble") as assemble_span:
+        prompt, reserved_tokens = child_prompt(message, age)
+        history = await conversation_memory.history(user_id, reserved_tokens) if user_id else []
+        assemble_span.set(history_messages=len(history))
+    return prompt, {"message": message, "history": history}
+
+
+async def child_chatbot(message: str, age: int = DEFAULT_CHILD_AGE, user_id=None, distress_detected=None):
+    """Child-friendly chatbot with safety education; user_id enables conversation memory.
 
-    # Check for distress keywords
-    distress_keywords = ["hurt", "uncomfortable", "scared", "touched", "secret", "help", "afraid"]
-    distress_detected = any(word in message.lower() for word in distress_keywords)
+    Pass distress_detected when the caller has already screened the message.
+    """
+    # Checked before generation, so it never waits on the model
+    if distress_detected is None:
+        distress_detected = detect_distress(message)
+    prompt, inputs = await child_chain_input(message, age, user_id)
+
+    # Run chain
+    response = await generate(prompt, inputs)
 
     return {
-        "response": response_text,
+        "response": response_text(response),
         "distressDetected": distress_detected
     }
 
 
-async def parent_chatbot(message: str):
-    """Parent guidance chatbot with expert advice and RAG"""
+async def child_chatbot_stream(message: str, age: int = DEFAULT_CHILD_AGE, user_id=None):
+    """Stream the child chatbot reply as text chunks"""
+    prompt, inputs = await child_chain_input(message, age, user_id)
+    async for chunk in generate_stream(prompt, inputs):
+        text = response_text(chunk)
+        if text:
+            yield text
 
-    # Retrieve relevant context from vector store
-    context = ""
-    if vectorstore:
-        print("\n--- RAG Retrieval ---")
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-        relevant_docs = retriever.get_relevant_documents(message)
-
-        print(f"Retrieved {len(relevant_docs)} relevant documents:")
-        for i, doc in enumerate(relevant_docs, 1):
-            print(f"\nDocument {i}:")
-            print(f"Source: {doc.metadata.get('source', 'Unknown')}")
-            print(f"Content: {doc.page_content[:200]}...")
-
-        # Combine retrieved documents into context
-        context = "\n\n".join([doc.page_content for doc in relevant_docs])
-        print(f"\n✓ RAG context prepared ({len(context)} characters)")
-        print("--- End RAG Retrieval ---\n")
-
-    system_prompt = f"""You are an expert advisor helping parents talk to their children
+
+def check_parent_cache():
+    """Drop cached parent answers if the vector store was rebuilt since they were made"""
+    global _parent_cache_build_id
+    build_id = vectorstore_build_id()
+    if build_id != _parent_cache_build_id:
+        parent_cache.clear()
+        _parent_cache_build_id = build_id
+
+
+# Message and context go in as template variables, so braces in either are kept as text
+parent_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You are an expert advisor helping parents talk to their children
     about personal safety, good touch/bad touch, and recognizing warning signs.
     Provide practical, empathetic advice with actionable steps.
     Reference child psychology and safety best practices.
@@ -130,23 +299,92 @@ async def parent_chatbot(message: str):
 
     {context}
 
-    If the context is relevant, incorporate it naturally into your advice."""
-
-    # Create chat prompt
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("human", f"{message}")
-    ])
+    If the context is relevant, incorporate it naturally into your advice."""),
+    ("human", "{message}")
+])
+
+
+async def prepare_parent_chat(message: str):
+    """Cache lookup plus RAG retrieval for a parent question.
+
+    Returns (cache_key, query_vector, cached_response, inputs), where inputs
+    fill parent_prompt; inputs is None when cached_response is set.
+    """
+    # Serve repeated questions from the cache, exact match first (no embedding needed)
+    check_parent_cache()
+    cache_key = normalize_query(message)
+    cached = parent_cache.get_exact(cache_key)
+    if cached is not None:
+        tracing.current_span().set(parent_cache="exact")
+        return cache_key, None, cached, None
+
+    query_vector = None
+    lexical_hits = []
+    retriever = await get_retriever_or_none()
+    if retriever:
+        # BM25 first: when it is decisive, skip the embedding pass altogether
+        lexical_hits = retriever.lexical(message)
+        if not retriever.decisive(lexical_hits):
+            query_vector = await run_stage("embed", embedding_service.embed(message), EMBED_TIMEOUT)
+    cached = parent_cache.get_similar(query_vector)
+    if cached is not None:
+        tracing.current_span().set(parent_cache="similar")
+        return cache_key, query_vector, cached, None
+    tracing.current_span().set(parent_cache="miss", rag_lexical_only=query_vector is None)
+
+    # Retrieve relevant context: BM25 and vector hits fused, or BM25 alone
+    context = ""
+    relevant_docs = None
+    if retriever:
+        # Reuse the query embedding computed for the cache lookup
+        with tracing.span("rag.retrieve") as retrieve_span:
+            relevant_docs = await retriever.asearch(query_vector, lexical_hits, k=RAG_CONTEXT_CANDIDATES)
+            retrieve_span.set(documents=len(relevant_docs or []),
+                              sources=[doc.metadata.get("source", "") for doc in relevant_docs or []])
+
+    assemble_span = tracing.span("prompt.assemble", chunks=len(relevant_docs or []))
+    if relevant_docs:
+        # Merge overlapping chunks, drop repeats and fit the token budget
+        context = context_assembler.assemble(relevant_docs)
+
+    assemble_span.set(context_tokens=estimate_tokens(context))
+    assemble_span.end()
+    return cache_key, query_vector, None, {"message": message, "context": context}
+
+
+async def parent_chatbot(message: str, prepared=None):
+    """Parent guidance chatbot with expert advice and RAG.
+
+    Pass prepared (from prepare_parent_chat) when the caller has already
+    checked the cache, e.g. to admit only cache misses to the model.
+    """
+    cache_key, query_vector, cached, inputs = prepared or await prepare_parent_chat(message)
+    if cached is not None:
+        return cached
 
     # Run chain
-    chain = prompt | llm
-    response = await chain.ainvoke({"message": message})
+    response = await generate(parent_prompt, inputs)
+    text = response_text(response)
 
-    # Extract text from response
-    if hasattr(response, 'content'):
-        return response.content
-    else:
-        return str(response)
+    parent_cache.store(cache_key, query_vector, text)
+    return text
+
+
+async def parent_chatbot_stream(message: str, prepared=None):
+    """Stream the parent chatbot reply as text chunks (a cached answer arrives as one chunk)"""
+    cache_key, query_vector, cached, inputs = prepared or await prepare_parent_chat(message)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async for chunk in generate_stream(parent_prompt, inputs):
+        text = response_text(chunk)
+        if text:
+            parts.append(text)
+            yield text
+
+    parent_cache.store(cache_key, query_vector, "".join(parts))
 
 
 async def main():
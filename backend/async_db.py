@@ -0,0 +1,78 @@
+"""Awaitable wrappers around database.py for use from async route handlers.
+
+Each call runs the synchronous sqlite3 function on a bounded thread pool so
+queries and commits never block the event loop. The pool is sized to match
+the connection pool, so a worker thread never waits on a connection.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import chat_archive
+import database
+import tracing
+from db_pool import DB_POOL_SIZE
+
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+def _offload(func):
+    span_name = f"db.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with tracing.span(span_name):
+            return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+def shutdown():
+    _executor.shutdown(wait=True)
+
+
+init_db = _offload(database.init_db)
+
+# USER CRUD
+create_user = _offload(database.create_user)
+get_user_by_email = _offload(database.get_user_by_email)
+get_user_by_id = _offload(database.get_user_by_id)
+
+# PARENT-CHILD LINKS
+link_parent_child = _offload(database.link_parent_child)
+get_parent_of_child = _offload(database.get_parent_of_child)
+get_children_of_parent = _offload(database.get_children_of_parent)
+is_child_linked = _offload(database.is_child_linked)
+get_parent_dashboard = _offload(database.get_parent_dashboard)
+
+# EMERGENCY ALERTS
+create_emergency_alert = _offload(database.create_emergency_alert)
+get_alerts_for_parent = _offload(database.get_alerts_for_parent)
+mark_alerts_seen = _offload(database.mark_alerts_seen)
+
+# CHAT HISTORY
+save_chat_message = _offload(database.save_chat_message)
+save_chat_messages = _offload(database.save_chat_messages)
+# Reads both the hot table and the compressed archive
+get_chat_history = _offload(chat_archive.get_chat_history)
+get_chat_turns_after = _offload(database.get_chat_turns_after)
+
+# CONVERSATION MEMORY
+get_conversation_summary = _offload(database.get_conversation_summary)
+save_conversation_summary = _offload(database.save_conversation_summary)
+
+# LESSONS
+create_lesson = _offload(database.create_lesson)
+get_lesson_by_id = _offload(database.get_lesson_by_id)
+get_all_lessons = _offload(database.get_all_lessons)
+get_lessons_with_questions = _offload(database.get_lessons_with_questions)
+
+# QUESTIONS
+create_question = _offload(database.create_question)
+get_question_by_id = _offload(database.get_question_by_id)
+get_questions_by_lesson = _offload(database.get_questions_by_lesson)
+
+# STUDENT PROGRESS
+track_student_progress = _offload(database.track_student_progress)
+get_student_progress = _offload(database.get_student_progress)
+get_progress_by_user = _offload(database.get_progress_by_user)
+get_progress_summary = _offload(database.get_progress_summary)
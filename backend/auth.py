@@ -1,31 +1,50 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 import jwt
 import hashlib
 from passlib.context import CryptContext
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from database import get_user_by_id
+import tracing
 
 # Simple secret key for MVP - in production, use environment variable
 SECRET_KEY = "awareme-mvp-secret-key-2024"
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-def create_token(user_id: str):
+@dataclass(frozen=True)
+class CurrentUser:
+    """Authenticated user as carried in the token claims"""
+    id: str
+    role: str
+    age: Optional[int] = None
+
+
+def create_token(user_id: str, role: Optional[str] = None, age: Optional[int] = None):
     payload = {
         "sub": user_id,
         "exp": datetime.now(timezone.utc) + timedelta(days=7)
     }
+    if role is not None:
+        payload["role"] = role
+    if age is not None:
+        payload["age"] = age
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
-def verify_token(token: str):
+def decode_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return payload["sub"]
+        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+def verify_token(token: str):
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -33,10 +52,22 @@ def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
+def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> CurrentUser:
     """Dependency to get current user from JWT token"""
-    token = credentials.credentials
-    user_id = verify_token(token)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    return user_id
+    with tracing.span("auth") as auth_span:
+        token = credentials.credentials
+        payload = decode_token(token)
+        if not payload or not payload.get("sub"):
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+        if "role" in payload:
+            auth_span.set(role=payload["role"])
+            return CurrentUser(id=payload["sub"], role=payload["role"], age=payload.get("age"))
+
+        # Tokens issued before role claims existed - fall back to the (cached) user lookup
+        auth_span.set(user_lookup=True)
+        user = get_user_by_id(payload["sub"])
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        auth_span.set(role=user['role'])
+        return CurrentUser(id=user['id'], role=user['role'], age=user['age'])
@@ -0,0 +1,793 @@
+"""Micro-benchmarks for the SafeNet backend.
+
+Run from the backend directory, e.g.:
+    python benchmark.py db-loop-lag --concurrency 32
+    python benchmark.py startup --runs 3
+    python benchmark.py embeddings --concurrency 1,4,16,64
+    python benchmark.py distress
+    python benchmark.py retrieval
+    python benchmark.py context
+    python benchmark.py load --concurrency 32 --duration 30
+    python benchmark.py failover --requests 500
+    python benchmark.py tracing
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label, samples, unit="ms"):
+    print(f"{label:<28} n={len(samples):<6} "
+          f"mean={statistics.fmean(samples) if samples else 0:.2f}{unit} "
+          f"p50={percentile(samples, 50):.2f}{unit} "
+          f"p95={percentile(samples, 95):.2f}{unit} "
+          f"p99={percentile(samples, 99):.2f}{unit} "
+          f"max={max(samples) if samples else 0:.2f}{unit}")
+
+
+def use_temp_database():
+    """Point database.py at a throwaway app.db and initialise it"""
+    import database
+    database.close_db_pool()
+    database.DATABASE = os.path.join(tempfile.mkdtemp(prefix="safenet-bench-"), "app.db")
+    database.init_db()
+    return database
+
+
+async def measure_loop_lag(workload, interval=0.005):
+    """Run workload() while sampling how late a periodic timer fires"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, loop.time() - expected) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await workload()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick
+    return lags, elapsed
+
+
+# DATABASE
+def bench_db_loop_lag(args):
+    database = use_temp_database()
+    import async_db
+
+    child_id = database.create_user("bench-child@example.com", "x", "child", "Bench", 9)
+    for lesson in database.get_all_lessons():
+        for _ in range(20):
+            database.track_student_progress(child_id, lesson['id'], 1, 2, False)
+
+    def request_sync():
+        database.get_user_by_id(child_id)
+        database.get_progress_by_user(child_id)
+        database.get_all_lessons()
+        database.save_chat_message(child_id, "hello", "hi there", False)
+
+    async def request_async():
+        await async_db.get_user_by_id(child_id)
+        await async_db.get_progress_by_user(child_id)
+        await async_db.get_all_lessons()
+        await async_db.save_chat_message(child_id, "hello", "hi there", False)
+
+    async def blocking_workload():
+        async def handler():
+            request_sync()
+            await asyncio.sleep(0)
+        for _ in range(args.rounds):
+            await asyncio.gather(*(handler() for _ in range(args.concurrency)))
+
+    async def offloaded_workload():
+        for _ in range(args.rounds):
+            await asyncio.gather(*(request_async() for _ in range(args.concurrency)))
+
+    requests = args.rounds * args.concurrency
+    for label, workload in (("blocking (sync sqlite3)", blocking_workload),
+                            ("offloaded (async_db)", offloaded_workload)):
+        lags, elapsed = asyncio.run(measure_loop_lag(workload))
+        report(f"{label} loop lag", lags)
+        print(f"{'':<28} {requests / elapsed:.0f} req/s over {elapsed:.2f}s")
+
+    async_db.shutdown()
+    database.close_db_pool()
+
+
+# STARTUP
+def bench_startup(args):
+    import_times = []
+    for _ in range(args.runs):
+        out = subprocess.run(
+            [sys.executable, "-c",
+             "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"],
+            capture_output=True, text=True, check=True
+        )
+        import_times.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    report("import main", import_times)
+
+    first_root, first_login, ready = [], [], []
+    login_body = json.dumps({"email": "nobody@example.com", "password": "secret123"}).encode("utf-8")
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base = f"http://127.0.0.1:{args.port}"
+        try:
+            root_ms = login_ms = ready_ms = None
+            while time.perf_counter() - started < args.timeout:
+                elapsed = (time.perf_counter() - started) * 1000
+                try:
+                    if root_ms is None:
+                        urllib.request.urlopen(f"{base}/", timeout=1).read()
+                        root_ms = elapsed
+                    elif login_ms is None:
+                        request = urllib.request.Request(
+                            f"{base}/api/auth/login", data=login_body,
+                            headers={"Content-Type": "application/json"}
+                        )
+                        urllib.request.urlopen(request, timeout=1).read()
+                        login_ms = elapsed
+                    else:
+                        urllib.request.urlopen(f"{base}/health/ready", timeout=1).read()
+                        ready_ms = elapsed
+                        break
+                except OSError:
+                    time.sleep(0.02)
+        finally:
+            server.terminate()
+            server.wait()
+        if root_ms is not None:
+            first_root.append(root_ms)
+        if login_ms is not None:
+            first_login.append(login_ms)
+        if ready_ms is not None:
+            ready.append(ready_ms)
+
+    report("first GET /", first_root)
+    report("first POST /api/auth/login", first_login)
+    report("GET /health/ready == 200", ready)
+
+
+# EMBEDDINGS
+class FakeEmbeddings:
+    """Stand-in model: fixed per-call overhead plus a per-text cost, like a CPU forward pass"""
+
+    def __init__(self, call_ms, per_text_ms):
+        self.call_ms = call_ms
+        self.per_text_ms = per_text_ms
+
+    def embed_documents(self, texts):
+        time.sleep((self.call_ms + self.per_text_ms * len(texts)) / 1000)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def bench_embeddings(args):
+    from embedding_service import EmbeddingService
+
+    if args.fake:
+        model = FakeEmbeddings(args.call_ms, args.per_text_ms)
+    else:
+        from ai_integration import get_embeddings
+        model = get_embeddings()
+
+    def queries(count, offset):
+        # A mix of repeated and unique questions, like real parent traffic
+        common = ["how do i start the conversation", "what warning signs should i watch for"]
+        return [common[i % 2] if i % 4 == 0 else f"parent question {offset}-{i}" for i in range(count)]
+
+    for concurrency in args.concurrency:
+        texts = queries(args.requests, concurrency)
+
+        async def direct():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(text):
+                async with semaphore:
+                    await asyncio.to_thread(model.embed_query, text)
+            await asyncio.gather(*(one(text) for text in texts))
+
+        async def batched():
+            service = EmbeddingService(lambda: model)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(text):
+                async with semaphore:
+                    await service.embed(text)
+            await asyncio.gather(*(one(text) for text in texts))
+            service.shutdown()
+            return service.stats()
+
+        for label, workload in (("direct", direct), ("batched+cached", batched)):
+            started = time.perf_counter()
+            stats = asyncio.run(workload())
+            elapsed = time.perf_counter() - started
+            extra = f" avg_batch={stats['avg_batch_size']} cache_hit_rate={stats['cache']['hit_rate']}" if stats else ""
+            print(f"concurrency={concurrency:<4} {label:<15} {args.requests / elapsed:8.1f} embeds/s{extra}")
+
+
+# DISTRESS DETECTION
+# The labelled corpus lives in distress_corpus.py; tests/test_distress.py asserts precision and recall on it
+
+
+def substring_distress(message):
+    """The original keyword check, for comparison"""
+    keywords = ["hurt", "uncomfortable", "scared", "touched", "secret", "help", "afraid"]
+    return any(word in message.lower() for word in keywords)
+
+
+def bench_distress(args):
+    from distress import DistressDetector
+    from distress_corpus import DISTRESS_CORPUS
+
+    detector = DistressDetector()
+    for label, detect in (("substring keywords", substring_distress),
+                          ("compiled lexicon", lambda text: detector.scan(text).detected)):
+        tp = fp = fn = 0
+        for text, expected in DISTRESS_CORPUS:
+            found = detect(text)
+            tp += found and expected
+            fp += found and not expected
+            fn += expected and not found
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        print(f"{label:<20} precision={precision:.2f} recall={recall:.2f} fp={fp} fn={fn}")
+
+        timings = []
+        for _ in range(args.rounds):
+            for text, _ in DISTRESS_CORPUS:
+                started = time.perf_counter()
+                detect(text)
+                timings.append((time.perf_counter() - started) * 1e6)
+        report(f"{label} latency", timings, unit="us")
+
+    if args.verbose:
+        for text, expected in DISTRESS_CORPUS:
+            result = detector.scan(text)
+            if result.detected != expected:
+                print(f"  mislabeled: {text!r} expected={expected} score={result.score} terms={result.terms}")
+
+
+# RETRIEVAL
+# Parent questions and terms a relevant chunk must contain (any of them)
+RETRIEVAL_QUERIES = [
+    ("What is grooming?", ["groom"]),
+    ("Childhelp hotline phone number", ["childhelp", "1-800"]),
+    ("How do I report a missing child?", ["missing"]),
+    ("Difference between good touch and bad touch", ["good touch", "bad touch"]),
+    ("Warning signs of child sexual abuse", ["sign", "indicator"]),
+    ("What does the WHO say about child maltreatment?", ["maltreatment"]),
+    ("UNICEF child protection programmes", ["unicef", "protection"]),
+    ("How common is child abuse worldwide?", ["million", "prevalence", "per cent", "%"]),
+    ("What should I do if my child tells me they were abused?", ["believe", "listen", "calm", "report"]),
+    ("NCMEC CyberTipline", ["cybertipline"]),
+    ("Online sexual exploitation of children", ["online", "exploitation"]),
+    ("How do I teach body safety to a young child?", ["body", "safe"]),
+    ("Long-term effects of abuse on children's health", ["consequence", "long-term", "health"]),
+    ("Child welfare services and foster care", ["welfare", "foster"]),
+]
+
+
+def bench_retrieval(args):
+    from ai_integration import embeddings_provider, get_retriever
+    from retrieval import VectorRetriever
+
+    retriever = get_retriever()
+    embeddings = embeddings_provider.get()
+    print(f"{len(retriever.lexical_index)} chunks, k={retriever.k}")
+
+    def relevant(docs, terms):
+        return any(term in doc.page_content.lower() for doc in docs for term in terms)
+
+    async def vector_only(query):
+        docs = await VectorRetriever.asearch(retriever, embeddings.embed_query(query))
+        return (docs or [])[:retriever.k]
+
+    async def lexical_only(query):
+        return await retriever.asearch(None, retriever.lexical(query))
+
+    async def hybrid(query):
+        return await retriever.asearch(embeddings.embed_query(query), retriever.lexical(query))
+
+    async def hybrid_fast_path(query):
+        hits = retriever.lexical(query)
+        vector = None if retriever.decisive(hits) else embeddings.embed_query(query)
+        return await retriever.asearch(vector, hits)
+
+    async def run(strategy):
+        hits, timings = 0, []
+        for _ in range(args.rounds):
+            for query, terms in RETRIEVAL_QUERIES:
+                started = time.perf_counter()
+                docs = await strategy(query)
+                timings.append((time.perf_counter() - started) * 1000)
+                hits += relevant(docs, terms)
+        return hits / (args.rounds * len(RETRIEVAL_QUERIES)), timings
+
+    for label, strategy in (("vector", vector_only), ("bm25", lexical_only),
+                            ("hybrid rrf", hybrid), ("hybrid + fast path", hybrid_fast_path)):
+        recall, timings = asyncio.run(run(strategy))
+        print(f"{label:<20} recall@{retriever.k}={recall:.2f}")
+        report(f"{label} latency", timings)
+
+    decisive = sum(retriever.decisive(retriever.lexical(query)) for query, _ in RETRIEVAL_QUERIES)
+    print(f"fast path taken for {decisive}/{len(RETRIEVAL_QUERIES)} queries")
+    retriever.shutdown()
+
+
+# RAG CONTEXT ASSEMBLY
+CONTEXT_TOPICS = {
+    "grooming": ["groomer", "gifts", "secrecy", "trust", "attention"],
+    "hotline": ["childhelp", "counselor", "call", "text", "confidential"],
+    "online safety": ["chat", "photos", "strangers", "games", "privacy"],
+    "body safety": ["private parts", "consent", "names", "hugs", "boundaries"],
+    "warning signs": ["nightmares", "withdrawal", "fear", "regression", "behaviour"],
+    "reporting": ["police", "services", "evidence", "report", "protection"],
+}
+CONTEXT_BOILERPLATE = [
+    "Skip to main content.",
+    "Sign up for our newsletter to get the latest updates.",
+    "Copyright 2024, all rights reserved.",
+]
+
+
+def synthetic_pages(rng, sentences_per_page=60):
+    """Cleaned pages in the shape build_vector_db.py produces: one line, site boilerplate, mirrored content"""
+    templates = [
+        "Parents should know that {a} and {b} often come up when talking about {topic}.",
+        "Experts explain how {a} relates to {topic}, especially where {b} is involved.",
+        "A child may mention {a} or {b}; stay calm and listen before asking about {topic}.",
+        "Research on {topic} shows that {a} matters more than most adults expect, as does {b}.",
+        "When {b} changes suddenly, consider whether {topic} and {a} could be the reason.",
+    ]
+    pages = {}
+    for topic, words in CONTEXT_TOPICS.items():
+        sentences = []
+        for i in range(sentences_per_page):
+            if i % 12 == 0:
+                sentences.extend(CONTEXT_BOILERPLATE)
+            a, b = rng.sample(words, 2)
+            sentences.append(rng.choice(templates).format(topic=topic, a=a, b=b) + f" (note {i})")
+        pages[f"https://example.org/{topic.replace(' ', '-')}"] = " ".join(sentences)
+        # A second site republishing most of the same page
+        mirrored = [sentence for sentence in sentences if rng.random() < 0.7]
+        pages[f"https://mirror.example.net/{topic.replace(' ', '-')}"] = " ".join(mirrored)
+    return pages
+
+
+def split_chunks(source, text, size=1200, overlap=200):
+    """Sentence-packed chunks overlapping by up to `overlap` characters, with start_index"""
+    from types import SimpleNamespace
+
+    starts, offset = [], 0
+    for sentence in text.split(". "):
+        starts.append(offset)
+        offset += len(sentence) + 2
+    chunks, first = [], 0
+    while first < len(starts):
+        last = first
+        while last + 1 < len(starts) and starts[last + 1] + 1 - starts[first] <= size:
+            last += 1
+        end = starts[last + 1] - 1 if last + 1 < len(starts) else len(text)
+        chunks.append(SimpleNamespace(page_content=text[starts[first]:end],
+                                      metadata={"source": source, "start_index": starts[first]}))
+        if last + 1 >= len(starts):
+            break
+        # Step back over trailing sentences that fit in the overlap
+        following = last + 1
+        while following - 1 > first and end - starts[following - 1] <= overlap:
+            following -= 1
+        first = following
+    return chunks
+
+
+def bench_context(args):
+    from context_assembly import (RAG_CONTEXT_CANDIDATES, RAG_CONTEXT_TOKENS, ContextAssembler, sentence_key,
+                                  split_sentences)
+    from conversation_memory import estimate_tokens
+
+    assembler = ContextAssembler(budget_tokens=args.budget or RAG_CONTEXT_TOKENS)
+    candidates = args.candidates or RAG_CONTEXT_CANDIDATES
+
+    if args.store:
+        from ai_integration import embeddings_provider, get_retriever
+
+        retriever = get_retriever()
+        embeddings = embeddings_provider.get()
+
+        def retrieve(query, k):
+            return asyncio.run(retriever.asearch(embeddings.embed_query(query), retriever.lexical(query), k=k))
+
+        queries = [query for query, _ in RETRIEVAL_QUERIES]
+    else:
+        from lexical_index import BM25Index
+
+        rng = random.Random(args.seed)
+        chunks = [chunk for source, text in synthetic_pages(rng).items() for chunk in split_chunks(source, text)]
+        index = BM25Index([c.page_content for c in chunks], [c.metadata for c in chunks])
+
+        def retrieve(query, k):
+            return [chunks[number] for number, _ in index.search(query, k)]
+
+        queries = [f"{topic} {word}" for topic, words in CONTEXT_TOPICS.items() for word in words]
+        print(f"{len(chunks)} synthetic chunks from {len(CONTEXT_TOPICS) * 2} pages")
+
+    def distinct(text):
+        return {sentence_key(sentence) for sentence in split_sentences(text)}
+
+    baseline_tokens, assembled_tokens, baseline_distinct, assembled_distinct = [], [], [], []
+    baseline_repeated, timings = [], []
+    for query in queries:
+        top = retrieve(query, 3)
+        baseline = "\n\n".join(doc.page_content for doc in top)
+        sentences = [sentence_key(s) for doc in top for s in split_sentences(doc.page_content)]
+        baseline_tokens.append(estimate_tokens(baseline))
+        baseline_distinct.append(len(set(sentences)))
+        baseline_repeated.append(1 - len(set(sentences)) / len(sentences) if sentences else 0.0)
+
+        docs = retrieve(query, candidates)
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            context = assembler.assemble(docs)
+            timings.append((time.perf_counter() - started) * 1000)
+        assembled_tokens.append(estimate_tokens(context))
+        assembled_distinct.append(len(distinct(context)))
+
+    print(f"top-3 verbatim      tokens={statistics.fmean(baseline_tokens):.0f} "
+          f"distinct sentences={statistics.fmean(baseline_distinct):.1f} "
+          f"repeated={statistics.fmean(baseline_repeated):.0%}")
+    print(f"assembled (top-{candidates}, budget {assembler.budget_tokens}) tokens={statistics.fmean(assembled_tokens):.0f} "
+          f"distinct sentences={statistics.fmean(assembled_distinct):.1f}")
+    saved = 1 - statistics.fmean(assembled_tokens) / statistics.fmean(baseline_tokens)
+    print(f"context tokens saved per prompt: {saved:.0%}")
+    report("assembly latency", timings)
+    stats = assembler.stats()
+    print(f"merged chunks={stats['merged_chunks']} duplicate passages={stats['duplicate_passages']} "
+          f"duplicate sentences={stats['duplicate_sentences']} truncated={stats['truncated']}")
+    if args.store:
+        retriever.shutdown()
+
+
+# PROVIDER FAILOVER
+class FlakyModel:
+    """Stand-in provider: lognormal latency, a slow tail and random failures"""
+
+    def __init__(self, median_ms, slow_rate, slow_ms, failure_rate, rng):
+        self.median_ms = median_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.failure_rate = failure_rate
+        self.rng = rng
+
+    async def ainvoke(self, prompt_value):
+        slow = self.rng.random() < self.slow_rate
+        await asyncio.sleep((self.slow_ms if slow else self.rng.lognormvariate(0, 0.3) * self.median_ms) / 1000)
+        if self.rng.random() < self.failure_rate:
+            raise RuntimeError("provider error")
+        return "ok"
+
+
+def bench_failover(args):
+    from llm_router import CircuitBreaker, ModelUnavailable, ProviderRouter
+
+    def provider(model):
+        async def get():
+            return model
+        return get
+
+    async def run(label, providers):
+        rng = random.Random(args.seed)
+        models = {
+            "primary": FlakyModel(args.primary_ms, args.slow_rate, args.slow_ms, args.failure_rate, rng),
+            "fallback": FlakyModel(args.fallback_ms, 0.0, 0.0, 0.0, rng),
+        }
+        router = ProviderRouter({name: provider(models[name]) for name in providers}, timeout=args.timeout,
+                                breakers={name: CircuitBreaker() for name in providers})
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies, failed = [], 0
+
+        async def one():
+            nonlocal failed
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await router.ainvoke("prompt")
+                except ModelUnavailable:
+                    failed += 1
+                    return
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        report(label, latencies)
+        stats = router.metrics()
+        print(f"{'':<28} failed={failed} hedges={stats['hedges']} hedge_wins={stats['hedge_wins']} "
+              f"failovers={stats['failovers']} primary_breaker_opens="
+              f"{stats['providers']['primary']['breaker']['opens']}")
+
+    asyncio.run(run("primary only", ["primary"]))
+    asyncio.run(run("primary + fallback", ["primary", "fallback"]))
+
+
+# TRACING
+# Spans a parent chat request opens: auth, database calls, RAG stages, prompt and generation
+TRACED_REQUEST_SPANS = ["auth", "db.get_user_by_id", "rag.lexical", "rag.embed", "rag.search", "rag.retrieve",
+                        "prompt.assemble", "prompt.format", "llm.attempt", "llm.generate"]
+
+
+def bench_tracing(args):
+    import tracing
+
+    def request(sample_rate):
+        with tracing.start_trace("POST /api/chat/parent", sample_rate):
+            for name in TRACED_REQUEST_SPANS:
+                with tracing.span(name) as s:
+                    s.set(documents=3)
+
+    def untraced():
+        for name in TRACED_REQUEST_SPANS:
+            {"documents": 3}
+
+    timings = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        untraced()
+        timings.append((time.perf_counter() - started) * 1e6)
+    report("no tracing calls", timings, unit="us")
+
+    tracing.exporter = tracing.SpanExporter(path=os.path.join(tempfile.mkdtemp(prefix="safenet-bench-"),
+                                                              "traces.jsonl"))
+    for rate in args.sample_rates:
+        timings = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            request(rate)
+            timings.append((time.perf_counter() - started) * 1e6)
+        report(f"sample rate {rate:g}", timings, unit="us")
+    tracing.exporter.stop()
+    stats = tracing.exporter.stats()
+    print(f"spans exported={stats['spans_exported']} dropped={stats['spans_dropped']}")
+
+
+# LOAD TEST
+LOAD_MIX = {"chat/child": 4, "chat/parent": 2, "learning/submit": 2, "emergency/alerts": 2}
+CHILD_MESSAGES = [
+    "What is good touch and bad touch?",
+    "Can you tell me a story about being safe?",
+    "What should I do if a stranger talks to me?",
+    "Is it ok to say no to a hug?",
+    "someone hurt me and I'm scared",
+]
+PARENT_MESSAGES = [
+    "How do I start a conversation with my 8-year-old about private parts?",
+    "What warning signs should I watch for?",
+    "How do I explain body safety to a toddler?",
+]
+
+
+def http_json(method, url, body=None, token=None, timeout=60):
+    """(status, parsed body) for one request; HTTP errors are returned, not raised"""
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def start_server(args):
+    """uvicorn on the chosen provider, with its databases in a throwaway directory"""
+    env = dict(os.environ, MODEL_PROVIDER=args.provider, HF_HUB_OFFLINE="1")
+    if not args.rate_limits:
+        env["CHAT_RATE_PER_MINUTE"] = "1000000"
+        env["CHAT_RATE_BURST"] = "1000000"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--app-dir", os.path.dirname(os.path.abspath(__file__))],
+        cwd=tempfile.mkdtemp(prefix="safenet-load-"), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    deadline = time.perf_counter() + args.timeout
+    while time.perf_counter() < deadline:
+        try:
+            urllib.request.urlopen(f"{base}/health/live", timeout=1).read()
+            return server, base
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("Server did not start")
+
+
+def seed_families(base, count):
+    """Sign up `count` parent/child pairs and link them; returns [(parent_token, child_token)]"""
+    run = f"{time.time_ns()}"
+    families = []
+    for i in range(count):
+        tokens = []
+        for role in ("parent", "child"):
+            status, body = http_json("POST", f"{base}/api/auth/signup", {
+                "email": f"load-{run}-{i}-{role}@example.com", "password": "loadtest123",
+                "role": role, "name": f"Load {role} {i}", "age": 9 if role == "child" else 40
+            })
+            if status != 200 or not body.get("success"):
+                raise SystemExit(f"Signup failed: {status} {body}")
+            tokens.append(body["token"])
+        http_json("POST", f"{base}/api/profile/link-child",
+                  {"childEmail": f"load-{run}-{i}-child@example.com"}, token=tokens[0])
+        families.append(tuple(tokens))
+    return families
+
+
+def bench_load(args):
+    server = None
+    base = args.url
+    if base is None:
+        server, base = start_server(args)
+    try:
+        families = seed_families(base, args.families)
+        _, lessons = http_json("GET", f"{base}/api/learning/lessons", token=families[0][1])
+        lessons = lessons["lessons"]
+        print(f"Seeded {len(families)} parent/child pairs, {len(lessons)} lessons; "
+              f"{args.concurrency} workers for {args.duration}s against {base}")
+
+        routes, weights = zip(*LOAD_MIX.items())
+        results = defaultdict(list)  # route -> [(status, ms)]
+        deadline = time.perf_counter() + args.duration
+
+        def call(rng, route):
+            parent_token, child_token = rng.choice(families)
+            if route == "chat/child":
+                return http_json("POST", f"{base}/api/chat/child",
+                                 {"message": rng.choice(CHILD_MESSAGES)}, token=child_token)
+            if route == "chat/parent":
+                return http_json("POST", f"{base}/api/chat/parent",
+                                 {"message": rng.choice(PARENT_MESSAGES)}, token=parent_token)
+            if route == "learning/submit":
+                lesson = rng.choice(lessons)
+                answers = [rng.randrange(4) for _ in lesson["questions"]]
+                return http_json("POST", f"{base}/api/learning/submit",
+                                 {"lessonId": lesson["id"], "answers": answers}, token=child_token)
+            return http_json("GET", f"{base}/api/emergency/alerts?limit=20", token=parent_token)
+
+        def worker(number):
+            rng = random.Random(args.seed + number)
+            while time.perf_counter() < deadline:
+                route = rng.choices(routes, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status, _ = call(rng, route)
+                except OSError:
+                    status = 0
+                results[route].append((status, (time.perf_counter() - started) * 1000))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(worker, range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        total = 0
+        for route in routes:
+            samples = results[route]
+            total += len(samples)
+            ok = [ms for status, ms in samples if status == 200]
+            errors = defaultdict(int)
+            for status, _ in samples:
+                if status != 200:
+                    errors[status] += 1
+            report(route, ok)
+            print(f"{'':<28} {len(ok) / elapsed:.1f} ok/s, errors {dict(errors) or 'none'}")
+        print(f"{'all routes':<28} {total / elapsed:.1f} req/s over {elapsed:.1f}s")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SafeNet backend benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("db-loop-lag", help="Event-loop lag with sync vs offloaded DB access")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--rounds", type=int, default=20)
+    p.set_defaults(func=bench_db_loop_lag)
+
+    p = sub.add_parser("startup", help="Import time and time to first response / readiness")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--timeout", type=float, default=120)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("embeddings", help="Query embedding throughput as concurrency rises")
+    p.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 4, 16, 64])
+    p.add_argument("--requests", type=int, default=256)
+    p.add_argument("--fake", action="store_true", help="Use a sleep-based stand-in instead of the real model")
+    p.add_argument("--call-ms", type=float, default=8.0, help="Fake model per-call overhead")
+    p.add_argument("--per-text-ms", type=float, default=1.0, help="Fake model per-text cost")
+    p.set_defaults(func=bench_embeddings)
+
+    p = sub.add_parser("distress", help="Distress detector precision/recall and per-message latency")
+    p.add_argument("--rounds", type=int, default=200)
+    p.add_argument("--verbose", action="store_true", help="List corpus messages the detector gets wrong")
+    p.set_defaults(func=bench_distress)
+
+    p = sub.add_parser("retrieval", help="Recall and latency of vector, BM25 and hybrid retrieval")
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=bench_retrieval)
+
+    p = sub.add_parser("context", help="RAG context size and repetition, verbatim chunks vs assembled")
+    p.add_argument("--budget", type=int, help="Context token budget (default: RAG_CONTEXT_TOKENS)")
+    p.add_argument("--candidates", type=int, help="Chunks retrieved for assembly (default: RAG_CONTEXT_CANDIDATES)")
+    p.add_argument("--rounds", type=int, default=20)
+    p.add_argument("--store", action="store_true", help="Use the built vector store instead of a synthetic corpus")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_context)
+
+    p = sub.add_parser("load", help="Concurrent load on chat, quiz and alert routes")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    p.add_argument("--families", type=int, default=20, help="Parent/child pairs to seed")
+    p.add_argument("--url", help="Target a running server instead of starting one")
+    p.add_argument("--provider", default="fake", help="MODEL_PROVIDER for the started server")
+    p.add_argument("--rate-limits", action="store_true", help="Keep per-user chat rate limits")
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--timeout", type=float, default=60)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser("failover", help="Provider router latency with a flaky primary, with and without fallback")
+    p.add_argument("--requests", type=int, default=500)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--primary-ms", type=float, default=80, help="Primary median latency")
+    p.add_argument("--fallback-ms", type=float, default=120, help="Fallback median latency")
+    p.add_argument("--slow-rate", type=float, default=0.05, help="Share of primary calls that stall")
+    p.add_argument("--slow-ms", type=float, default=3000, help="Primary stall duration")
+    p.add_argument("--failure-rate", type=float, default=0.02, help="Share of primary calls that fail")
+    p.add_argument("--timeout", type=float, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_failover)
+
+    p = sub.add_parser("tracing", help="Per-request cost of tracing spans at several sample rates")
+    p.add_argument("--requests", type=int, default=20000)
+    p.add_argument("--sample-rates", type=lambda v: [float(r) for r in v.split(",")], default=[0, 0.01, 0.1, 1])
+    p.set_defaults(func=bench_tracing)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from langchain_community.document_loaders import WebBaseLoader
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
+from lexical_index import LEXICAL_INDEX_FILE, BM25Index
 
 # Load API key
 load_dotenv()
@@ -97,6 +98,7 @@ with open("file.txt", "w", encoding="utf-8") as f:
 splitter = RecursiveCharacterTextSplitter(
     chunk_size=1200,
     chunk_overlap=200,
+    add_start_index=True,  # lets context_assembly.py merge neighbouring chunks
     separators=["\n\n", "\n", ". ", " ", ""]
 )
 splits = splitter.split_documents(docs)
@@ -131,6 +133,16 @@ try:
     )
     print(f"✓ Index successfully built and stored with {len(splits)} chunks.")
     print(f"✓ Vector store saved to: {persist_dir}")
+
+    # BM25 index over the same chunks, for hybrid retrieval
+    BM25Index([split.page_content for split in splits], [split.metadata for split in splits]).save(
+        os.path.join(persist_dir, LEXICAL_INDEX_FILE)
+    )
+    print(f"✓ Lexical index saved to: {os.path.join(persist_dir, LEXICAL_INDEX_FILE)}")
+
+    # Tell running API servers the store changed (clears cached parent answers)
+    with open(os.path.join(persist_dir, ".build_id"), "w") as f:
+        f.write(str(len(splits)))
 except Exception as e:
     print(f"Error during indexing: {str(e)}")
     import traceback
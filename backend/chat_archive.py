@@ -0,0 +1,202 @@
+"""Retention tiers for chat_history.
+
+Rows older than CHAT_RETENTION_DAYS are moved out of the hot chat_history
+table into a separate SQLite file (CHAT_ARCHIVE_DB) as zlib-compressed JSON
+blocks, one or more per user per calendar month. get_chat_history reads
+both tiers, so callers see one newest-first history.
+
+A block and the ids of the messages in it (chat_archive_ids) are committed
+together, before the rows are deleted from app.db. If a run stops in
+between, the next one finds those ids already archived and only deletes
+them, so no message is archived twice.
+
+Run the archival incrementally (safe to interrupt and re-run):
+    python chat_archive.py --days 90 --batch 1000
+"""
+import json
+import os
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+import database
+from db_pool import ConnectionPool
+
+CHAT_ARCHIVE_DB = os.getenv("CHAT_ARCHIVE_DB", "chat_archive.db")
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "90"))
+CHAT_ARCHIVE_BATCH = int(os.getenv("CHAT_ARCHIVE_BATCH", "1000"))
+
+COLUMNS = ("id", "user_id", "message", "response", "distress_detected", "created_at")
+
+_pool = None
+
+
+def get_archive_pool():
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(CHAT_ARCHIVE_DB, size=2)
+        with _pool.connection() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS chat_archive_blocks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT,
+                    month TEXT,
+                    first_created_at TEXT,
+                    last_created_at TEXT,
+                    row_count INTEGER,
+                    payload BLOB
+                )
+            """)
+            db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_blocks_user_last
+                ON chat_archive_blocks (user_id, last_created_at)
+            """)
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS chat_archive_ids (
+                    id TEXT PRIMARY KEY,
+                    block_id INTEGER
+                ) WITHOUT ROWID
+            """)
+    return _pool
+
+
+def close_archive_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def _pack(rows):
+    return zlib.compress(json.dumps([list(row) for row in rows], ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _unpack(payload):
+    return [dict(zip(COLUMNS, values)) for values in json.loads(zlib.decompress(payload))]
+
+
+# ARCHIVAL
+def archive_batch(cutoff, batch_size=CHAT_ARCHIVE_BATCH):
+    """Move up to batch_size rows older than cutoff into the archive; return rows moved"""
+    with database.get_db() as db:
+        rows = db.execute(
+            f"""SELECT {", ".join(COLUMNS)} FROM chat_history
+                WHERE created_at < ?
+                ORDER BY created_at, id LIMIT ?""",
+            (cutoff, batch_size)
+        ).fetchall()
+    if not rows:
+        return 0
+
+    # Archive first, then delete. Rows archived by an interrupted earlier run are only deleted.
+    with get_archive_pool().connection() as archive:
+        archived = set()
+        ids = [row['id'] for row in rows]
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            archived.update(r['id'] for r in archive.execute(
+                f"SELECT id FROM chat_archive_ids WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+
+        blocks = defaultdict(list)
+        for row in rows:
+            if row['id'] not in archived:
+                blocks[(row['user_id'], row['created_at'][:7])].append(row)
+
+        for (user_id, month), block in blocks.items():
+            block_id = archive.execute(
+                """INSERT INTO chat_archive_blocks
+                   (user_id, month, first_created_at, last_created_at, row_count, payload)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (user_id, month, block[0]['created_at'], block[-1]['created_at'], len(block), _pack(block))
+            ).lastrowid
+            archive.executemany("INSERT INTO chat_archive_ids VALUES (?, ?)",
+                                [(row['id'], block_id) for row in block])
+
+    _delete_hot([row['id'] for row in rows])
+    return len(rows)
+
+
+def _delete_hot(ids):
+    with database.get_db() as db:
+        db.executemany("DELETE FROM chat_history WHERE id = ?", [(chat_id,) for chat_id in ids])
+
+
+def archive_older_than(days=CHAT_RETENTION_DAYS, batch_size=CHAT_ARCHIVE_BATCH, max_batches=None):
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        batches += 1
+    return total
+
+
+# READS
+def read_archived(user_id, since=None, until=None, before=None, limit=50, exclude_ids=()):
+    """Archived rows for a user, newest first, with the same filters as database.get_chat_history"""
+    upper = min(filter(None, [until, before[0] if before else None]), default=None)
+    conditions, params = ["user_id = ?"], [user_id]
+    if since is not None:
+        conditions.append("last_created_at >= ?")
+        params.append(since)
+    if upper is not None:
+        conditions.append("first_created_at <= ?")
+        params.append(upper)
+
+    results = []
+    with get_archive_pool().connection() as archive:
+        blocks = archive.execute(
+            f"""SELECT last_created_at, payload FROM chat_archive_blocks
+                WHERE {" AND ".join(conditions)}
+                ORDER BY last_created_at DESC""",
+            params
+        )
+        for block in blocks:
+            # Blocks come newest-last-row first: once one ends before our limit-th row, we are done
+            if len(results) >= limit and block['last_created_at'] < results[limit - 1]['created_at']:
+                break
+            for row in _unpack(block['payload']):
+                if row['id'] in exclude_ids:
+                    continue
+                if since is not None and row['created_at'] < since:
+                    continue
+                if until is not None and row['created_at'] >= until:
+                    continue
+                if before is not None and (row['created_at'], row['id']) >= tuple(before):
+                    continue
+                results.append(row)
+            results.sort(key=lambda row: (row['created_at'], row['id']), reverse=True)
+
+    return results[:limit]
+
+
+def get_chat_history(user_id, since=None, until=None, before=None, limit=50):
+    """Newest-first chat history across the hot table and the archive"""
+    rows = database.get_chat_history(user_id, since, until, before, limit)
+    if len(rows) >= limit or not os.path.exists(CHAT_ARCHIVE_DB):
+        return rows
+
+    # Continue below the oldest hot row
+    if rows:
+        before = (rows[-1]['created_at'], rows[-1]['id'])
+    archived = read_archived(
+        user_id, since, until, before, limit - len(rows),
+        exclude_ids={row['id'] for row in rows}
+    )
+    return list(rows) + archived
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move old chat history into the compressed archive")
+    parser.add_argument("--days", type=int, default=CHAT_RETENTION_DAYS, help="Keep this many days hot")
+    parser.add_argument("--batch", type=int, default=CHAT_ARCHIVE_BATCH, help="Rows moved per transaction")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
+    args = parser.parse_args()
+
+    database.init_db()
+    moved = archive_older_than(args.days, args.batch, args.max_batches)
+    print(f"✓ Archived {moved} chat messages older than {args.days} days to {CHAT_ARCHIVE_DB}")
@@ -0,0 +1,158 @@
+"""Write-behind buffer for chat_history inserts.
+
+Chat turns are queued in memory and written in batches with executemany,
+one transaction per batch, once CHAT_FLUSH_ROWS rows are waiting or
+CHAT_FLUSH_MS has passed since the first row in the batch. The queue is
+bounded (CHAT_QUEUE_SIZE); when it is full, enqueue waits for the writer.
+A batch that fails to write (database locked, pool timeout) is retried
+CHAT_WRITE_ATTEMPTS times with a growing delay before it is counted failed.
+Emergency alerts do not go through here - see distress_alerts.py.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+import async_db as db
+import metrics
+
+CHAT_FLUSH_ROWS = int(os.getenv("CHAT_FLUSH_ROWS", "64"))
+CHAT_FLUSH_MS = float(os.getenv("CHAT_FLUSH_MS", "200"))
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "10000"))
+CHAT_WRITE_ATTEMPTS = int(os.getenv("CHAT_WRITE_ATTEMPTS", "5"))
+CHAT_RETRY_DELAY = float(os.getenv("CHAT_RETRY_DELAY", "0.2"))
+
+_STOP = object()
+
+
+class ChatHistoryWriter:
+    def __init__(self, flush_rows=CHAT_FLUSH_ROWS, flush_ms=CHAT_FLUSH_MS, max_size=CHAT_QUEUE_SIZE,
+                 attempts=CHAT_WRITE_ATTEMPTS, retry_delay=CHAT_RETRY_DELAY):
+        self.flush_rows = flush_rows
+        self.flush_delay = flush_ms / 1000
+        self.max_size = max_size
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self._queue = None
+        self._batch_ready = None
+        self._task = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.retries = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._batch_ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the writer"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        self._batch_ready.set()
+        await self._task
+        self._task = None
+
+    async def enqueue(self, user_id, message, response, distress_detected=False):
+        chat_id = str(uuid.uuid4())
+        row = (chat_id, user_id, message, response, int(distress_detected),
+               datetime.utcnow().isoformat())
+        if self.running:
+            await self._queue.put(row)
+            if self._queue.qsize() >= self.flush_rows:
+                self._batch_ready.set()
+        else:
+            # Not started (e.g. scripts) - write straight through
+            await self._flush([row])
+        return chat_id
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+
+            # Give the batch until the deadline to fill up, unless it already has
+            if self._queue.qsize() + 1 < self.flush_rows:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            batch = [first]
+            while len(batch) < self.flush_rows and not self._queue.empty():
+                row = self._queue.get_nowait()
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+        # Anything enqueued while stopping is written before we exit
+        leftover = []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not _STOP:
+                leftover.append(row)
+        if leftover:
+            await self._flush(leftover)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        for attempt in range(1, self.attempts + 1):
+            try:
+                await db.save_chat_messages(batch)
+                break
+            except Exception as e:
+                if attempt == self.attempts:
+                    self.rows_failed += len(batch)
+                    print(f"Error: Could not write {len(batch)} chat messages after {attempt} attempts: {e}")
+                    return
+                self.retries += 1
+                await asyncio.sleep(self.retry_delay * attempt)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.rows_written += len(batch)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    def metrics(self):
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_size,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "retries": self.retries,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+
+writer = ChatHistoryWriter()
+metrics.register("chat_writer", writer.metrics)
+
+
+def start():
+    writer.start()
+
+
+async def stop():
+    await writer.stop()
+
+
+async def enqueue(user_id, message, response, distress_detected=False):
+    return await writer.enqueue(user_id, message, response, distress_detected)
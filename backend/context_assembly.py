@@ -0,0 +1,237 @@
+"""Assembly of retrieved chunks into the parent chatbot's RAG context.
+
+build_vector_db.py splits pages into 1200-character chunks overlapping by
+200, so the top hits often repeat each other. Before they go into the
+prompt the retrieved chunks are:
+
+1. merged: chunks from the same source that overlap or touch become one
+   passage with the shared span kept once (located by the chunks'
+   start_index, or by matching the overlapping text for stores built
+   without it);
+2. deduplicated: a passage whose word shingles are mostly covered by more
+   relevant passages is dropped, and so is any sentence already included
+   (site navigation, footers and other boilerplate);
+3. fitted: passages are added in relevance order until RAG_CONTEXT_TOKENS
+   is used up, the last one cut at a sentence boundary.
+"""
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional
+from conversation_memory import estimate_tokens
+from lexical_index import tokenize
+
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "700"))
+# Chunks retrieved for assembly; more than fit, so deduplication leaves room for new material
+RAG_CONTEXT_CANDIDATES = int(os.getenv("RAG_CONTEXT_CANDIDATES", "5"))
+# Share of a passage already covered by better passages at which it is dropped
+RAG_CONTEXT_DUPLICATE = float(os.getenv("RAG_CONTEXT_DUPLICATE", "0.8"))
+
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400  # chunk_overlap plus the splitter's separator slack
+ADJACENT_GAP_CHARS = 3  # separators stripped between consecutive chunks
+MIN_TAIL_TOKENS = 40  # smallest useful truncated passage
+SHINGLE_WORDS = 3
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_NON_WORD = re.compile(r"\W+")
+
+
+@dataclass
+class Passage:
+    source: str
+    text: str
+    rank: int  # best retrieval rank among its chunks, 0 = most relevant
+    start: Optional[int] = None
+    chunks: int = 1
+
+
+def text_overlap(left, right, min_chars=MIN_OVERLAP_CHARS, max_chars=MAX_OVERLAP_CHARS):
+    """Length of the longest suffix of left that is also a prefix of right"""
+    limit = min(len(left), len(right), max_chars)
+    if limit < min_chars:
+        return 0
+    tail = left[-limit:]
+    probe = right[:min_chars]
+    at = tail.find(probe)
+    while at != -1:
+        if right.startswith(tail[at:]):
+            return limit - at
+        at = tail.find(probe, at + 1)
+    return 0
+
+
+def join_passages(left, right):
+    """left and right merged into one passage when they overlap or touch, else None"""
+    if left.start is not None and right.start is not None:
+        if right.start < left.start:
+            left, right = right, left
+        left_end = left.start + len(left.text)
+        if right.start > left_end + ADJACENT_GAP_CHARS:
+            return None
+        if right.start + len(right.text) <= left_end:
+            text = left.text
+        elif right.start >= left_end:
+            text = left.text + " " + right.text
+        else:
+            text = left.text + right.text[left_end - right.start:]
+        start = left.start
+    else:
+        if right.text in left.text:
+            text = left.text
+        elif left.text in right.text:
+            text = right.text
+        elif overlap := text_overlap(left.text, right.text):
+            text = left.text + right.text[overlap:]
+        elif overlap := text_overlap(right.text, left.text):
+            text = right.text + left.text[overlap:]
+        else:
+            return None
+        start = None
+    return Passage(left.source, text, min(left.rank, right.rank), start, left.chunks + right.chunks)
+
+
+def split_sentences(text):
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def sentence_key(sentence):
+    return _NON_WORD.sub(" ", sentence.lower()).strip()
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    words = tokenize(text)
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def fit_sentences(text, tokens):
+    """The leading whole sentences of text that fit in tokens"""
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        cost = estimate_tokens(sentence + " ")
+        if used + cost > tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept)
+
+
+class ContextAssembler:
+    def __init__(self, budget_tokens=RAG_CONTEXT_TOKENS, duplicate_threshold=RAG_CONTEXT_DUPLICATE):
+        self.budget_tokens = budget_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.calls = 0
+        self.chunks_in = 0
+        self.passages_out = 0
+        self.merged = 0
+        self.duplicate_passages = 0
+        self.duplicate_sentences = 0
+        self.truncated = 0
+        self.dropped = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self._total_ms = 0.0
+        self.max_ms = 0.0
+
+    def merge(self, docs):
+        """Passages from documents in relevance order, overlapping chunks joined"""
+        merged = []
+        for rank, doc in enumerate(docs):
+            metadata = doc.metadata or {}
+            passage = Passage(metadata.get("source", ""), doc.page_content.strip(), rank,
+                              metadata.get("start_index"))
+            # Joining two passages can make a third one adjacent, so retry until nothing changes
+            changed = True
+            while changed:
+                changed = False
+                for i, other in enumerate(merged):
+                    if other.source != passage.source:
+                        continue
+                    joined = join_passages(other, passage)
+                    if joined is not None:
+                        passage = joined
+                        del merged[i]
+                        self.merged += 1
+                        changed = True
+                        break
+            merged.append(passage)
+        return sorted(merged, key=lambda p: p.rank)
+
+    def select(self, docs):
+        """Merged, deduplicated passages that fit the token budget, most relevant first"""
+        started = time.perf_counter()
+        self.calls += 1
+        self.chunks_in += len(docs)
+        self.tokens_in += sum(estimate_tokens(doc.page_content) for doc in docs)
+
+        selected = []
+        covered = set()
+        seen_sentences = set()
+        used = 0
+        for passage in self.merge(docs):
+            passage_shingles = shingles(passage.text)
+            if passage_shingles and \
+                    len(passage_shingles & covered) / len(passage_shingles) >= self.duplicate_threshold:
+                self.duplicate_passages += 1
+                continue
+
+            sentences, keys = [], set()
+            for sentence in split_sentences(passage.text):
+                key = sentence_key(sentence)
+                if key in seen_sentences or key in keys:
+                    self.duplicate_sentences += 1
+                    continue
+                sentences.append(sentence)
+                keys.add(key)
+            text = " ".join(sentences)
+            if not text:
+                self.duplicate_passages += 1
+                continue
+
+            remaining = self.budget_tokens - used
+            if estimate_tokens(text) > remaining:
+                # Cut at a sentence boundary if enough room is left, else try a smaller passage
+                text = fit_sentences(text, remaining) if remaining >= MIN_TAIL_TOKENS else ""
+                if not text:
+                    self.dropped += 1
+                    continue
+                self.truncated += 1
+            passage.text = text
+            selected.append(passage)
+            covered |= shingles(text)
+            seen_sentences.update(sentence_key(sentence) for sentence in split_sentences(text))
+            used += estimate_tokens(text)
+
+        self.passages_out += len(selected)
+        self.tokens_out += used
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        return selected
+
+    def assemble(self, docs):
+        """Prompt context text for retrieved documents"""
+        return "\n\n".join(passage.text for passage in self.select(docs))
+
+    def stats(self):
+        return {
+            "budget_tokens": self.budget_tokens,
+            "calls": self.calls,
+            "chunks_in": self.chunks_in,
+            "passages_out": self.passages_out,
+            "merged_chunks": self.merged,
+            "duplicate_passages": self.duplicate_passages,
+            "duplicate_sentences": self.duplicate_sentences,
+            "truncated": self.truncated,
+            "dropped_over_budget": self.dropped,
+            "avg_tokens_in": round(self.tokens_in / self.calls, 1) if self.calls else 0.0,
+            "avg_tokens_out": round(self.tokens_out / self.calls, 1) if self.calls else 0.0,
+            "avg_ms": round(self._total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+context_assembler = ContextAssembler()
@@ -0,0 +1,140 @@
+"""Bounded multi-turn memory for the chatbots, loaded from chat_history.
+
+The newest turns are replayed verbatim; older ones are folded, a few at a
+time, into a rolling summary stored in conversation_summaries, so a long
+conversation never costs more than one summary plus MEMORY_RECENT_TURNS
+turns. Everything is trimmed to fit CHAT_PROMPT_TOKENS. Folding calls the
+LLM, so it runs in the background after the turn that triggered it rather
+than on the request path.
+
+Turns still waiting in the chat_writer queue (at most CHAT_FLUSH_MS old)
+are not visible yet.
+"""
+import asyncio
+import os
+import time
+import async_db as db
+
+CHAT_PROMPT_TOKENS = int(os.getenv("CHAT_PROMPT_TOKENS", "1500"))
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "6"))
+MEMORY_FOLD_TURNS = int(os.getenv("MEMORY_FOLD_TURNS", "6"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "250"))
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate_tokens(text, tokens):
+    return text if estimate_tokens(text) <= tokens else text[:max(0, tokens - 1) * CHARS_PER_TOKEN]
+
+
+def format_transcript(turns):
+    return "\n".join(f"Child: {turn['message']}\nAssistant: {turn['response']}" for turn in turns)
+
+
+class ConversationMemory:
+    def __init__(self, summarize, prompt_tokens=CHAT_PROMPT_TOKENS, recent_turns=MEMORY_RECENT_TURNS,
+                 fold_turns=MEMORY_FOLD_TURNS, summary_tokens=MEMORY_SUMMARY_TOKENS):
+        # summarize(previous_summary, turns) -> new summary text
+        self._summarize = summarize
+        self.prompt_tokens = prompt_tokens
+        self.recent_turns = recent_turns
+        self.fold_turns = fold_turns
+        self.summary_tokens = summary_tokens
+        self._folding = set()
+        self._tasks = set()
+        self.loads = 0
+        self.load_failures = 0
+        self.folds = 0
+        self.fold_failures = 0
+        self.truncated = 0
+        self._history_tokens = 0
+        self._total_load_ms = 0.0
+
+    async def history(self, user_id, reserved_tokens=0):
+        """Prompt messages for a user's earlier conversation, oldest first.
+
+        reserved_tokens is what the rest of the prompt (system prompt, new
+        message) already uses; the history fills what is left of the budget.
+        """
+        started = time.perf_counter()
+        try:
+            summary = await db.get_conversation_summary(user_id)
+            through = (summary['through_created_at'], summary['through_id']) if summary else None
+            # One page covers the verbatim window plus a full fold's worth
+            turns = await db.get_chat_turns_after(user_id, through, self.recent_turns + self.fold_turns)
+        except Exception as e:
+            self.load_failures += 1
+            print(f"Warning: Could not load conversation memory: {e}")
+            return []
+
+        if len(turns) >= self.recent_turns + self.fold_turns:
+            self._schedule_fold(user_id)
+
+        available = self.prompt_tokens - reserved_tokens
+        messages = []
+        if summary and summary['summary']:
+            text = truncate_tokens(summary['summary'], min(self.summary_tokens, available))
+            if text:
+                messages.append(("system", f"Summary of the earlier conversation: {text}"))
+                available -= estimate_tokens(text)
+
+        recent = []
+        for turn in turns[:self.recent_turns]:  # newest first
+            cost = estimate_tokens(turn['message']) + estimate_tokens(turn['response'])
+            if cost > available:
+                self.truncated += 1
+                break
+            recent.append(turn)
+            available -= cost
+        for turn in reversed(recent):
+            messages.append(("human", turn['message']))
+            messages.append(("ai", turn['response']))
+
+        self.loads += 1
+        self._history_tokens += self.prompt_tokens - reserved_tokens - available
+        self._total_load_ms += (time.perf_counter() - started) * 1000
+        return messages
+
+    def _schedule_fold(self, user_id):
+        if user_id in self._folding:
+            return
+        self._folding.add(user_id)
+        task = asyncio.get_running_loop().create_task(self._fold(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, user_id):
+        """Fold the oldest unsummarised turns into the stored summary"""
+        try:
+            summary = await db.get_conversation_summary(user_id)
+            through = (summary['through_created_at'], summary['through_id']) if summary else None
+            turns = await db.get_chat_turns_after(user_id, through, self.fold_turns, newest_first=False)
+            if not turns:
+                return
+            text = await self._summarize(summary['summary'] if summary else "", turns)
+            text = truncate_tokens(text.strip(), self.summary_tokens)
+            last = turns[-1]
+            await db.save_conversation_summary(user_id, text, (last['created_at'], last['id']))
+            self.folds += 1
+        except Exception as e:
+            self.fold_failures += 1
+            print(f"Warning: Could not update conversation summary: {e}")
+        finally:
+            self._folding.discard(user_id)
+
+    def stats(self):
+        return {
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            "folds": self.folds,
+            "fold_failures": self.fold_failures,
+            "folds_in_progress": len(self._folding),
+            "truncated": self.truncated,
+            "avg_history_tokens": round(self._history_tokens / self.loads, 1) if self.loads else 0.0,
+            "avg_load_ms": round(self._total_load_ms / self.loads, 2) if self.loads else 0.0,
+        }
@@ -1,20 +1,57 @@
-import sqlite3
+import heapq
+import itertools
+import os
 import uuid
 from contextlib import contextmanager
 from datetime import datetime
 import json
+from cache import TTLCache
+from db_pool import ConnectionPool
+from migrations import migrate
+import metrics
 
 DATABASE = "app.db"
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+_pool = None
+
+# Only found users are cached; misses always hit the database
+_users_by_id = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+_users_by_email = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Bumped whenever lessons or questions change so cached catalogs can be dropped
+_catalog_version = 0
+
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(DATABASE)
+    return _pool
+
+
+def close_db_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+    _users_by_id.clear()
+    _users_by_email.clear()
+
+
+def user_cache_stats():
+    return {"by_id": _users_by_id.stats(), "by_email": _users_by_email.stats()}
+
+
+metrics.register("user_cache", user_cache_stats)
+
 
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    try:
+    with get_pool().connection() as conn:
         yield conn
-        conn.commit()
-    finally:
-        conn.close()
 
 
 def populate_initial_lessons(db):
@@ -136,93 +173,8 @@ def populate_initial_lessons(db):
 
 def init_db():
     with get_db() as db:
-        # Users table
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                email TEXT UNIQUE,
-                password_hash TEXT,
-                role TEXT,
-                name TEXT,
-                age INTEGER
-            )
-        """)
-
-        # Parent-Child relationships
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS parent_child_links (
-                id TEXT PRIMARY KEY,
-                parent_id TEXT,
-                child_id TEXT,
-                created_at TEXT,
-                FOREIGN KEY (parent_id) REFERENCES users(id),
-                FOREIGN KEY (child_id) REFERENCES users(id)
-            )
-        """)
-
-        # Emergency alerts
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS emergency_alerts (
-                id TEXT PRIMARY KEY,
-                user_id TEXT,
-                message TEXT,
-                location TEXT,
-                created_at TEXT,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-
-        # Chat history
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id TEXT PRIMARY KEY,
-                user_id TEXT,
-                message TEXT,
-                response TEXT,
-                distress_detected INTEGER,
-                created_at TEXT,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-
-        # Lessons table
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS lessons (
-                id TEXT PRIMARY KEY,
-                title TEXT,
-                description TEXT,
-                content TEXT,
-                created_at TEXT
-            )
-        """)
-
-        # Questions table
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS questions (
-                id TEXT PRIMARY KEY,
-                lesson_id TEXT,
-                question TEXT,
-                options TEXT,
-                correct_answer INTEGER,
-                explanation TEXT,
-                FOREIGN KEY (lesson_id) REFERENCES lessons(id)
-            )
-        """)
-
-        # Student progress table
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS student_progress (
-                id TEXT PRIMARY KEY,
-                user_id TEXT,
-                lesson_id TEXT,
-                score INTEGER,
-                total_questions INTEGER,
-                passed INTEGER,
-                completed_at TEXT,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (lesson_id) REFERENCES lessons(id)
-            )
-        """)
+        # Create tables and indexes, upgrading older databases in place
+        migrate(db)
 
         # Populate lessons with initial data
         populate_initial_lessons(db)
@@ -230,6 +182,23 @@ def init_db():
 
 
 # USER CRUD
+def invalidate_user(user_id=None, email=None):
+    """Drop a user from the cache - call after any write to the users table"""
+    if user_id is not None:
+        cached = _users_by_id.pop(user_id)
+        if cached is not None:
+            _users_by_email.pop(cached['email'])
+    if email is not None:
+        cached = _users_by_email.pop(email)
+        if cached is not None:
+            _users_by_id.pop(cached['id'])
+
+def _cache_user(user):
+    if user is not None:
+        _users_by_id.set(user['id'], user)
+        _users_by_email.set(user['email'], user)
+    return user
+
 def create_user(email, password_hash, role, name, age=None):
     with get_db() as db:
         user_id = str(uuid.uuid4())
@@ -237,22 +206,29 @@ def create_user(email, password_hash, role, name, age=None):
             "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)",
             (user_id, email, password_hash, role, name, age)
         )
-        return user_id
+    invalidate_user(user_id, email)
+    return user_id
 
 def get_user_by_email(email):
+    user = _users_by_email.get(email)
+    if user is not None:
+        return user
     with get_db() as db:
-        return db.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+        return _cache_user(db.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone())
 
 def get_user_by_id(user_id):
+    user = _users_by_id.get(user_id)
+    if user is not None:
+        return user
     with get_db() as db:
-        return db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return _cache_user(db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone())
 
 # PARENT-CHILD LINKS
 def link_parent_child(parent_id, child_id):
     with get_db() as db:
         link_id = str(uuid.uuid4())
         db.execute(
-            "INSERT INTO parent_child_links VALUES (?, ?, ?, ?)",
+            "INSERT INTO parent_child_links (id, parent_id, child_id, created_at) VALUES (?, ?, ?, ?)",
             (link_id, parent_id, child_id, datetime.utcnow().isoformat())
         )
         return link_id
@@ -265,6 +241,13 @@ def get_parent_of_child(child_id):
         ).fetchone()
         return result['parent_id'] if result else None
 
+def is_child_linked(parent_id, child_id):
+    with get_db() as db:
+        return db.execute(
+            "SELECT 1 FROM parent_child_links WHERE parent_id = ? AND child_id = ? LIMIT 1",
+            (parent_id, child_id)
+        ).fetchone() is not None
+
 def get_children_of_parent(parent_id):
     with get_db() as db:
         return db.execute(
@@ -274,6 +257,26 @@ def get_children_of_parent(parent_id):
             (parent_id,)
         ).fetchall()
 
+def get_parent_dashboard(parent_id):
+    """Every linked child with profile, progress summary and unseen alert count, in one query"""
+    with get_db() as db:
+        return db.execute(
+            """SELECT u.id, u.email, u.name, u.age,
+                      (SELECT COUNT(*) FROM lessons) AS total_lessons,
+                      ps.user_id, ps.completed_lessons, ps.total_correct, ps.total_attempted,
+                      ps.attempts, ps.last_activity,
+                      (SELECT COUNT(*) FROM emergency_alerts ea
+                       WHERE ea.user_id = u.id
+                         AND ea.created_at > COALESCE(pcl.alerts_seen_at, '')) AS unread_alerts
+               FROM parent_child_links pcl
+               JOIN users u ON u.id = pcl.child_id
+               LEFT JOIN progress_summary ps ON ps.user_id = u.id
+               WHERE pcl.parent_id = ?
+               GROUP BY u.id
+               ORDER BY MIN(pcl.created_at)""",
+            (parent_id,)
+        ).fetchall()
+
 # EMERGENCY ALERTS
 def create_emergency_alert(user_id, message, location=None):
     with get_db() as db:
@@ -284,15 +287,57 @@ def create_emergency_alert(user_id, message, location=None):
         )
         return alert_id
 
-def get_alerts_for_parent(parent_id):
+def mark_alerts_seen(parent_id, child_id=None):
+    """Mark alerts as seen for all of a parent's children, or just one"""
     with get_db() as db:
-        return db.execute(
-            """SELECT ea.* FROM emergency_alerts ea
-               JOIN parent_child_links pcl ON ea.user_id = pcl.child_id
-               WHERE pcl.parent_id = ?
-               ORDER BY ea.created_at DESC""",
-            (parent_id,)
-        ).fetchall()
+        sql = "UPDATE parent_child_links SET alerts_seen_at = ? WHERE parent_id = ?"
+        params = [datetime.utcnow().isoformat(), parent_id]
+        if child_id is not None:
+            sql += " AND child_id = ?"
+            params.append(child_id)
+        return db.execute(sql, params).rowcount
+
+def _keyset_filter(since=None, until=None, before=None):
+    """SQL conditions for a newest-first page: since <= created_at < until, (created_at, id) < before"""
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("created_at < ?")
+        params.append(until)
+    if before is not None:
+        conditions.append("(created_at, id) < (?, ?)")
+        params.extend(before)
+    return "".join(f" AND {c}" for c in conditions), params
+
+def get_alerts_for_parent(parent_id, since=None, until=None, before=None, limit=None):
+    """Alerts for all of a parent's children, newest first.
+
+    `before` is a (created_at, id) keyset cursor. Each child is read with its
+    own index range scan and the results merged, so a page costs at most
+    `limit` rows per child however long the history is.
+    """
+    where, params = _keyset_filter(since, until, before)
+    limit_sql = " LIMIT ?" if limit is not None else ""
+    limit_params = [limit] if limit is not None else []
+
+    with get_db() as db:
+        child_ids = [row['child_id'] for row in db.execute(
+            "SELECT child_id FROM parent_child_links WHERE parent_id = ?", (parent_id,)
+        )]
+        per_child = [
+            db.execute(
+                f"""SELECT * FROM emergency_alerts
+                    WHERE user_id = ?{where}
+                    ORDER BY created_at DESC, id DESC{limit_sql}""",
+                [child_id, *params, *limit_params]
+            ).fetchall()
+            for child_id in dict.fromkeys(child_ids)
+        ]
+
+    merged = heapq.merge(*per_child, key=lambda row: (row['created_at'], row['id']), reverse=True)
+    return list(itertools.islice(merged, limit))
 
 # CHAT HISTORY
 def save_chat_message(user_id, message, response, distress_detected=False):
@@ -305,7 +350,66 @@ def save_chat_message(user_id, message, response, distress_detected=False):
         )
         return chat_id
 
+def save_chat_messages(rows):
+    """Insert many (id, user_id, message, response, distress_detected, created_at) rows in one transaction.
+
+    Rows already present are skipped, so a retried batch is not written twice.
+    """
+    with get_db() as db:
+        db.executemany("INSERT OR IGNORE INTO chat_history VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+def get_chat_history(user_id, since=None, until=None, before=None, limit=50):
+    """A user's chat turns, newest first, paged by a (created_at, id) keyset cursor"""
+    where, params = _keyset_filter(since, until, before)
+    with get_db() as db:
+        return db.execute(
+            f"""SELECT * FROM chat_history
+                WHERE user_id = ?{where}
+                ORDER BY created_at DESC, id DESC LIMIT ?""",
+            [user_id, *params, limit]
+        ).fetchall()
+
+def get_chat_turns_after(user_id, after=None, limit=50, newest_first=True):
+    """A user's chat turns after a (created_at, id) position, e.g. those not yet summarised"""
+    where, params = ("", []) if after is None else (" AND (created_at, id) > (?, ?)", list(after))
+    order = "DESC" if newest_first else "ASC"
+    with get_db() as db:
+        return db.execute(
+            f"""SELECT * FROM chat_history
+                WHERE user_id = ?{where}
+                ORDER BY created_at {order}, id {order} LIMIT ?""",
+            [user_id, *params, limit]
+        ).fetchall()
+
+# CONVERSATION MEMORY
+def get_conversation_summary(user_id):
+    with get_db() as db:
+        return db.execute(
+            "SELECT * FROM conversation_summaries WHERE user_id = ?", (user_id,)
+        ).fetchone()
+
+def save_conversation_summary(user_id, summary, through):
+    """Store the rolling summary covering every chat turn up to the (created_at, id) `through`"""
+    with get_db() as db:
+        db.execute(
+            """INSERT INTO conversation_summaries VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET
+                   summary = excluded.summary,
+                   through_created_at = excluded.through_created_at,
+                   through_id = excluded.through_id,
+                   updated_at = excluded.updated_at""",
+            (user_id, summary, through[0], through[1], datetime.utcnow().isoformat())
+        )
+
 # LESSONS
+def catalog_version():
+    return _catalog_version
+
+def bump_catalog_version():
+    global _catalog_version
+    _catalog_version += 1
+
 def create_lesson(title, description, content):
     with get_db() as db:
         lesson_id = str(uuid.uuid4())
@@ -313,7 +417,8 @@ def create_lesson(title, description, content):
             "INSERT INTO lessons VALUES (?, ?, ?, ?, ?)",
             (lesson_id, title, description, content, datetime.utcnow().isoformat())
         )
-        return lesson_id
+    bump_catalog_version()
+    return lesson_id
 
 def get_lesson_by_id(lesson_id):
     with get_db() as db:
@@ -323,6 +428,17 @@ def get_all_lessons():
     with get_db() as db:
         return db.execute("SELECT * FROM lessons").fetchall()
 
+def get_lessons_with_questions():
+    """All lessons joined to their questions, one row per question (NULL q_id if none)"""
+    with get_db() as db:
+        return db.execute(
+            """SELECT l.id, l.title, l.description, l.content,
+                      q.id AS q_id, q.question, q.options, q.correct_answer, q.explanation
+               FROM lessons l
+               LEFT JOIN questions q ON q.lesson_id = l.id
+               ORDER BY l.rowid, q.rowid"""
+        ).fetchall()
+
 # QUESTIONS
 def create_question(lesson_id, question, options, correct_answer, explanation=""):
     with get_db() as db:
@@ -331,7 +447,8 @@ def create_question(lesson_id, question, options, correct_answer, explanation=""
             "INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?)",
             (question_id, lesson_id, question, options, correct_answer, explanation)
         )
-        return question_id
+    bump_catalog_version()
+    return question_id
 
 def get_question_by_id(question_id):
     with get_db() as db:
@@ -345,9 +462,28 @@ def get_questions_by_lesson(lesson_id):
 def track_student_progress(user_id, lesson_id, score, total_questions, passed):
     with get_db() as db:
         progress_id = str(uuid.uuid4())
+        completed_at = datetime.utcnow().isoformat()
         db.execute(
             "INSERT INTO student_progress VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (progress_id, user_id, lesson_id, score, total_questions, int(passed), datetime.utcnow().isoformat())
+            (progress_id, user_id, lesson_id, score, total_questions, int(passed), completed_at)
+        )
+
+        # Keep the per-user aggregate in step, in the same transaction
+        summary = db.execute(
+            "SELECT completed_lessons FROM progress_summary WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        completed = set(json.loads(summary['completed_lessons'])) if summary else set()
+        if passed:
+            completed.add(lesson_id)
+        db.execute(
+            """INSERT INTO progress_summary VALUES (?, ?, ?, ?, 1, ?)
+               ON CONFLICT(user_id) DO UPDATE SET
+                   completed_lessons = excluded.completed_lessons,
+                   total_correct = total_correct + excluded.total_correct,
+                   total_attempted = total_attempted + excluded.total_attempted,
+                   attempts = attempts + 1,
+                   last_activity = excluded.last_activity""",
+            (user_id, json.dumps(sorted(completed)), score, total_questions, completed_at)
         )
         return progress_id
 
@@ -367,6 +503,15 @@ def get_progress_by_user(user_id):
             (user_id,)
         ).fetchall()
 
+def get_progress_summary(user_id):
+    """Aggregate progress for a user plus the current lesson count, in one row"""
+    with get_db() as db:
+        return db.execute(
+            """SELECT (SELECT COUNT(*) FROM lessons) AS total_lessons, ps.*
+               FROM (SELECT 1) LEFT JOIN progress_summary ps ON ps.user_id = ?""",
+            (user_id,)
+        ).fetchone()
+
 
 if __name__ == '__main__':
     init_db()
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""Distress detection for child chat messages.
+
+A weighted lexicon of words and phrases is expanded into its common
+inflections (hurt -> hurts, hurting; touch me -> touched me) and compiled
+into a single regular expression with word boundaries, matched against the
+casefolded, NFKC-normalized message, so "helpful" no longer matches "help"
+and "ABUSE" or "abuſe" still match "abuse". Each distinct term found adds its
+weight to the message score, and the message counts as distress once the
+score reaches the threshold: a strong phrase such as "touched me" is enough
+on its own, while a feeling such as "scared" needs an intensifier ("really
+scared"), a target ("scared of him") or a second term, and an ambiguous
+word such as "help" needs company.
+
+The lexicon can be replaced with a JSON file of {"term": weight} via
+DISTRESS_LEXICON; DISTRESS_THRESHOLD sets the score needed.
+"""
+import json
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Tuple
+
+DISTRESS_THRESHOLD = float(os.getenv("DISTRESS_THRESHOLD", "2"))
+
+DEFAULT_LEXICON = {
+    # Enough on their own
+    "hurt me": 3, "hit me": 3, "beat me": 3, "kick me": 3, "punch me": 3, "slap me": 3,
+    "touch me": 3, "touch my private": 3, "touch my privates": 3, "bad touch": 3,
+    "abuse": 3, "molest": 3, "rape": 3, "kill myself": 3, "want to die": 3,
+    "hurt myself": 3, "cut myself": 3, "suicide": 3, "self harm": 3,
+    "keep a secret": 2, "kept a secret": 2, "keep it a secret": 2, "kept it a secret": 2,
+    "keep it secret": 2, "kept it secret": 2, "keep this a secret": 2, "kept this a secret": 2,
+    "keep this secret": 2, "kept this secret": 2, "keep secret": 2, "kept secret": 2,
+    "our secret": 2, "our little secret": 3, "nobody would believe me": 2, "no one would believe me": 2,
+    "don't tell": 2, "dont tell": 2, "not allowed to tell": 3, "force me": 3,
+    "take off my clothes": 3, "took off my clothes": 3, "naked": 2,
+    # Feelings aimed at someone, or at home
+    "scared of him": 2, "scared of her": 2, "scared of them": 2, "afraid of him": 2, "afraid of her": 2,
+    "afraid of them": 2, "scared to go home": 3, "afraid to go home": 3, "don't feel safe": 2,
+    "dont feel safe": 2, "bully me": 2, "being bullied": 2, "threaten me": 2,
+    "feel scared": 2, "feel afraid": 2,
+    # Rarely everyday for a child, so enough on their own
+    "terrified": 3, "unsafe": 2, "uncomfortable": 2, "frightened": 2,
+    # Often everyday ("I hurt my knee", "scared of the dark"): they need an intensifier or
+    # a second term
+    "hurt": 1.5, "scared": 1.5, "afraid": 1.5, "threaten": 1.5, "bully": 1.5, "touched": 1.5,
+    # Ambiguous alone ("help me with my homework", "a secret recipe")
+    "help": 1, "secret": 1, "cry": 1, "sad": 1, "alone": 1, "nightmare": 1,
+}
+
+# Words that make a feeling persistent or strong ("really scared", "keeps hurting"). They add
+# INTENSIFIER_WEIGHT once, and only to a message that already matched a lexicon term.
+DEFAULT_INTENSIFIERS = ("really", "very", "always", "keep", "all the time", "every day", "every night", "anymore")
+INTENSIFIER_WEIGHT = 0.5
+
+# Words in a phrase that are matched literally rather than inflected
+_FIXED_WORDS = {
+    "me", "my", "myself", "a", "an", "the", "to", "i", "you", "him", "her", "it", "our",
+    "not", "don't", "dont", "off", "little", "private", "privates", "clothes", "die",
+    "of", "them", "home", "being", "this", "nobody", "no", "one", "would", "believe", "all", "the", "time", "every", "day", "night", "anymore",
+}
+_VOWELS = set("aeiou")
+
+
+def inflections(word):
+    """The word plus its regular plural / past / progressive forms"""
+    forms = {word, word + "s", word + "es", word + "ed", word + "ing"}
+    if word.endswith("e"):
+        forms |= {word + "d", word[:-1] + "ing"}
+    if word.endswith("y") and len(word) > 2 and word[-2] not in _VOWELS:
+        forms |= {word[:-1] + "ies", word[:-1] + "ied"}
+    # hit -> hitting, slap -> slapped
+    if len(word) >= 3 and word[-1] not in _VOWELS | {"w", "x", "y"} \
+            and word[-2] in _VOWELS and word[-3] not in _VOWELS:
+        forms |= {word + word[-1] + "ed", word + word[-1] + "ing"}
+    return forms
+
+
+def _phrase_forms(term):
+    forms = [""]
+    for word in term.split():
+        variants = {word} if word in _FIXED_WORDS else inflections(word)
+        forms = [f"{prefix} {variant}".strip() for prefix in forms for variant in variants]
+    return forms
+
+
+def load_lexicon(path=None):
+    path = path or os.getenv("DISTRESS_LEXICON")
+    if not path:
+        return dict(DEFAULT_LEXICON)
+    with open(path, encoding="utf-8") as f:
+        return {term.lower(): float(weight) for term, weight in json.load(f).items()}
+
+
+def _normalize(text):
+    # NFKC and casefold, so look-alikes such as "ſ" (long s) or fullwidth letters match too
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().replace("’", "'").split())
+
+
+@dataclass(frozen=True)
+class DistressResult:
+    detected: bool
+    score: float
+    terms: Tuple[str, ...]
+
+
+class DistressDetector:
+    def __init__(self, lexicon=None, threshold=DISTRESS_THRESHOLD, intensifiers=DEFAULT_INTENSIFIERS):
+        self.lexicon = load_lexicon() if lexicon is None else lexicon
+        self.threshold = threshold
+        self.intensifiers = set(intensifiers) - set(self.lexicon)
+        # surface form -> lexicon term or intensifier
+        self._forms = {}
+        for term in [*self.lexicon, *self.intensifiers]:
+            for form in _phrase_forms(_normalize(term)):
+                self._forms.setdefault(form, term)
+        # Longest first so a phrase wins over the single word it starts with
+        alternatives = sorted(self._forms, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"(?<![\w'])(?:" + "|".join(re.escape(form).replace(r"\ ", r"\s+") for form in alternatives) + r")(?![\w'])"
+        )
+        self.scanned = 0
+        self.detected = 0
+        self._total_us = 0.0
+        self.max_us = 0.0
+
+    def scan(self, message):
+        started = time.perf_counter()
+        # Matched against the normalized message, so every match is a key of _forms as it stands
+        terms = {self._forms[match] for match in self._pattern.findall(_normalize(message))}
+        score = sum(self.lexicon[term] for term in terms - self.intensifiers)
+        if score and terms & self.intensifiers:
+            score += INTENSIFIER_WEIGHT
+        result = DistressResult(score >= self.threshold, score, tuple(sorted(terms)))
+
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        self.scanned += 1
+        self.detected += result.detected
+        self._total_us += elapsed_us
+        self.max_us = max(self.max_us, elapsed_us)
+        return result
+
+    def stats(self):
+        return {
+            "terms": len(self.lexicon),
+            "patterns": len(self._forms),
+            "threshold": self.threshold,
+            "scanned": self.scanned,
+            "detected": self.detected,
+            "avg_us": round(self._total_us / self.scanned, 1) if self.scanned else 0.0,
+            "max_us": round(self.max_us, 1),
+        }
+
+
+detector = DistressDetector()
+
+
+def detect_distress(message: str):
+    return detector.scan(message).detected
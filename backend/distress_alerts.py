@@ -0,0 +1,97 @@
+"""Emergency alerts for distress in child chats, raised alongside generation.
+
+As soon as a message is flagged, raise_alert() starts a task that writes the
+emergency alert (retrying transient database errors) while the chatbot is
+still generating, so the alert neither waits for nor depends on the LLM.
+Parents see it through the alerts endpoints as soon as the row commits.
+The time from detection to committed alert row is tracked as
+distress_to_alert_ms. On shutdown, drain() waits for alerts in flight.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+import async_db as db
+import metrics
+
+ALERT_WRITE_ATTEMPTS = int(os.getenv("ALERT_WRITE_ATTEMPTS", "3"))
+ALERT_RETRY_DELAY = float(os.getenv("ALERT_RETRY_DELAY", "0.1"))
+
+
+class DistressAlerts:
+    def __init__(self, attempts=ALERT_WRITE_ATTEMPTS, retry_delay=ALERT_RETRY_DELAY):
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self._tasks = set()
+        self.raised = 0
+        self.written = 0
+        self.unlinked = 0
+        self.retries = 0
+        self.failed = 0
+        self._latencies_ms = deque(maxlen=1024)
+        self.max_latency_ms = 0.0
+
+    def raise_alert(self, user_id, message, detected_at=None):
+        """Start writing the alert in the background and return the task"""
+        detected_at = time.perf_counter() if detected_at is None else detected_at
+        self.raised += 1
+        task = asyncio.get_running_loop().create_task(self._write(user_id, message, detected_at))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _write(self, user_id, message, detected_at):
+        for attempt in range(1, self.attempts + 1):
+            try:
+                if not await db.get_parent_of_child(user_id):
+                    self.unlinked += 1
+                    return None
+                alert_id = await db.create_emergency_alert(
+                    user_id,
+                    f"Distress detected in chat: {message[:100]}",
+                    "Chat conversation"
+                )
+                break
+            except Exception as e:
+                if attempt == self.attempts:
+                    self.failed += 1
+                    print(f"Error: Could not write emergency alert for {user_id}: {e}")
+                    return None
+                self.retries += 1
+                await asyncio.sleep(self.retry_delay * attempt)
+
+        latency_ms = (time.perf_counter() - detected_at) * 1000
+        self.written += 1
+        self._latencies_ms.append(latency_ms)
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        return alert_id
+
+    async def drain(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def metrics(self):
+        latencies = sorted(self._latencies_ms)
+        return {
+            "raised": self.raised,
+            "written": self.written,
+            "in_flight": len(self._tasks),
+            "no_linked_parent": self.unlinked,
+            "retries": self.retries,
+            "failed": self.failed,
+            "distress_to_alert_ms_p50": round(latencies[len(latencies) // 2], 2) if latencies else 0.0,
+            "distress_to_alert_ms_p95": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else 0.0,
+            "distress_to_alert_ms_max": round(self.max_latency_ms, 2),
+        }
+
+
+alerts = DistressAlerts()
+metrics.register("distress_alerts", alerts.metrics)
+
+
+def raise_alert(user_id, message, detected_at=None):
+    return alerts.raise_alert(user_id, message, detected_at)
+
+
+async def drain():
+    await alerts.drain()
@@ -0,0 +1,75 @@
+"""Labelled child messages for measuring the distress detector.
+
+Labels say whether a safeguarding reviewer would want a parent alerted, not
+what the lexicon happens to match. Used by tests/test_distress.py, which
+asserts precision and recall on it, and by `python benchmark.py distress`.
+"""
+
+# (text, is_distress)
+DISTRESS_CORPUS = [
+    # Distress
+    ("Someone hurt me", True),
+    ("my uncle hurts me when mom is gone", True),
+    ("He touched me and said it's our little secret", True),
+    ("a man touched my privates", True),
+    ("I'm scared to go home", True),
+    ("I feel afraid and I don't know what to do", True),
+    ("He said don't tell anyone", True),
+    ("She keeps hitting me", True),
+    ("My brother beat me up again", True),
+    ("I want to die", True),
+    ("sometimes I want to hurt myself", True),
+    ("he made me take off my clothes", True),
+    ("I'm not allowed to tell my mom", True),
+    ("it felt like a bad touch", True),
+    ("I'm being bullied at school and I'm so sad", True),
+    ("I feel uncomfortable around my coach", True),
+    ("Please help, I'm really frightened", True),
+    ("He threatened me if I told", True),
+    ("I cry every night and I feel alone", True),
+    ("he said nobody would believe me", True),
+    ("I feel unsafe", True),
+    ("I am terrified", True),
+    ("He told me to keep it a secret", True),
+    ("I am feeling uncomfortable.", True),
+    ("she makes me keep secrets from mom", True),
+    ("I'm frightened", True),
+    ("I'm really scared of my stepdad", True),
+    ("the big kids bully me every day", True),
+    ("I don't feel safe at home", True),
+    ("I'm scared of him", True),
+    ("he makes me uncomfortable when we're alone", True),
+    ("I get hurt all the time at home", True),
+    # Everyday messages, including feelings that are not about harm
+    ("I hurt my knee at football", False),
+    ("my knee hurts", False),
+    ("I'm scared of the dark", False),
+    ("My dad is scared of spiders lol", False),
+    ("The bully in the story learned to be kind", False),
+    ("I was afraid I'd fail my spelling test", False),
+    ("That movie touched my heart", False),
+    ("Thanks, that was really helpful!", False),
+    ("whelp, I lost my game", False),
+    ("Can you help me with my homework?", False),
+    ("What is a secret recipe?", False),
+    ("We played hide and seek", False),
+    ("My dog is called Shelper", False),
+    ("The helper at school is nice", False),
+    ("What are good touches?", False),
+    ("I made a scarecrow today", False),
+    ("That movie was touching", False),
+    ("I love my mom and dad", False),
+    ("What should I do if a stranger talks to me?", False),
+    ("Is it ok to say no to a hug?", False),
+    ("I got a new bike for my birthday", False),
+    ("Can you tell me a joke?", False),
+    ("My teacher is very kind", False),
+    ("I had a good day at the park", False),
+    ("Help me understand private parts", False),
+    ("My friend told me a secret about her birthday party", False),
+    ("The hurtle in gym class was high", False),
+    ("I really need help with fractions", False),
+    ("The roller coaster was very scary", False),
+    ("These new shoes are uncomfortable", False),
+    ("I was terrified on the big slide but it was fun", False),
+]
@@ -0,0 +1,98 @@
+"""Micro-batching, caching front end for the query embedding model.
+
+Concurrent embed() calls that arrive within EMBED_BATCH_WINDOW_MS of each
+other are sent to the model as one embed_documents() batch (up to
+EMBED_MAX_BATCH texts), on a single dedicated worker thread. Results are
+kept in an LRU cache so repeated queries never reach the model, and
+identical texts already waiting in a batch share one result.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cache import TTLCache
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+
+
+class EmbeddingService:
+    def __init__(self, get_model, max_batch=EMBED_MAX_BATCH, window_ms=EMBED_BATCH_WINDOW_MS,
+                 cache_size=EMBED_CACHE_SIZE):
+        self._get_model = get_model
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.cache = TTLCache(cache_size, ttl=float("inf"))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._pending = {}  # text -> future, in arrival order
+        self._timer = None
+        self.batches = 0
+        self.texts_embedded = 0
+        self.max_batch_seen = 0
+        self._total_batch_ms = 0.0
+
+    async def embed(self, text):
+        vector = self.cache.get(text)
+        if vector is not None:
+            return vector
+
+        future = self._pending.get(text)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[text] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # shield: one caller giving up must not cancel the result for the others
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        asyncio.get_running_loop().create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        texts = list(batch)
+        started = time.perf_counter()
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._embed_documents, texts
+            )
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts_embedded += len(texts)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        self._total_batch_ms += (time.perf_counter() - started) * 1000
+        for text, vector in zip(texts, vectors):
+            self.cache.set(text, vector)
+            future = batch[text]
+            if not future.done():
+                future.set_result(vector)
+
+    def _embed_documents(self, texts):
+        return self._get_model().embed_documents(texts)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts_embedded": self.texts_embedded,
+            "avg_batch_size": round(self.texts_embedded / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_batch_ms": round(self._total_batch_ms / self.batches, 2) if self.batches else 0.0,
+            "pending": len(self._pending),
+            "cache": self.cache.stats(),
+        }
@@ -0,0 +1,114 @@
+"""Deterministic offline stand-in for the chat model (MODEL_PROVIDER=fake).
+
+No network and no model download: replies are canned texts chosen by a
+hash of the prompt, and timing follows a configurable distribution, so chat
+routes can be load-tested in CI or on an air-gapped machine. The same
+prompt always gets the same reply and the same simulated latency.
+
+FAKE_LLM_LATENCY is the time to first token, one of
+    fixed:<ms>, uniform:<min_ms>:<max_ms>, lognormal:<median_ms>:<sigma>
+FAKE_LLM_TOKENS_PER_SEC paces the rest of the reply (one token per word).
+FAKE_LLM_RESPONSES optionally points at a JSON list of replies.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:300:0.5")
+FAKE_LLM_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "40"))
+FAKE_LLM_RESPONSES = os.getenv("FAKE_LLM_RESPONSES")
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED", "0")
+
+DEFAULT_RESPONSES = [
+    "That's a great question! 😊 Your body belongs to you. If anyone touches you in a way that "
+    "feels wrong, it's okay to say NO and tell a trusted adult right away.",
+    "Good touches feel safe, like a hug from family when you want one. Bad touches make you feel "
+    "scared or confused. You can always talk to a grown-up you trust. 💙",
+    "You are brave for sharing that. Please tell a trusted adult, like a parent or teacher, "
+    "about how you feel. You are never in trouble for asking for help.",
+    "Start with a calm, everyday moment and use correct names for body parts. Explain that some "
+    "parts are private, that no one should touch them or ask to see them, and that secrets about "
+    "touching are never okay. Reassure your child they can always come to you.",
+    "Watch for sudden changes in behaviour, new fears of a person or place, and secrets with an "
+    "older person. Stay calm, believe your child, and contact a hotline such as Childhelp for "
+    "guidance on next steps.",
+]
+
+
+def parse_latency(spec):
+    """Sampler for a FAKE_LLM_LATENCY spec: rng -> milliseconds"""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid FAKE_LLM_LATENCY: {spec!r}")
+
+
+def load_responses(path=FAKE_LLM_RESPONSES):
+    if not path:
+        return list(DEFAULT_RESPONSES)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeLLM(LLM):
+    """LangChain LLM returning canned replies with simulated latency"""
+
+    responses: List[str]
+    latency: Any
+    tokens_per_sec: float = FAKE_LLM_TOKENS_PER_SEC
+    seed: str = FAKE_LLM_SEED
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _plan(self, prompt):
+        """(reply tokens, first-token delay s, per-token delay s), fixed per prompt"""
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+        reply = self.responses[int.from_bytes(digest[:4], "big") % len(self.responses)]
+        tokens = [word + " " for word in reply.split()]
+        tokens[-1] = tokens[-1].rstrip()
+        return tokens, self.latency(rng) / 1000, 1 / self.tokens_per_sec
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        tokens, first, per_token = self._plan(prompt)
+        time.sleep(first + per_token * (len(tokens) - 1))
+        return "".join(tokens)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        tokens, first, per_token = self._plan(prompt)
+        await asyncio.sleep(first + per_token * (len(tokens) - 1))
+        return "".join(tokens)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs) -> Iterator[GenerationChunk]:
+        tokens, delay, per_token = self._plan(prompt)
+        for token in tokens:
+            time.sleep(delay)
+            delay = per_token
+            yield GenerationChunk(text=token)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs) -> AsyncIterator[GenerationChunk]:
+        tokens, delay, per_token = self._plan(prompt)
+        for token in tokens:
+            await asyncio.sleep(delay)
+            delay = per_token
+            yield GenerationChunk(text=token)
+
+
+def get_fake_llm():
+    return FakeLLM(responses=load_responses(), latency=parse_latency(FAKE_LLM_LATENCY))
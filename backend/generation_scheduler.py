@@ -0,0 +1,180 @@
+"""Dynamic batching for the local HuggingFace text-generation pipeline.
+
+With MODEL_PROVIDER=huggingface every chat request would otherwise run its
+own generate() call on CPU. Requests are instead queued and a dedicated
+inference thread drains them in left-padded batches of up to HF_MAX_BATCH
+prompts, waiting at most HF_BATCH_WAIT_MS after the first prompt for the
+batch to fill. BatchedPipelineLLM exposes the scheduler as a LangChain LLM
+so `prompt | llm` chains work unchanged.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, List, Optional
+from langchain_core.language_models.llms import LLM
+import metrics
+
+HF_MAX_BATCH = int(os.getenv("HF_MAX_BATCH", "8"))
+HF_BATCH_WAIT_MS = float(os.getenv("HF_BATCH_WAIT_MS", "25"))
+HF_QUEUE_SIZE = int(os.getenv("HF_QUEUE_SIZE", "256"))
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when the generation queue is full"""
+
+
+class _Request:
+    __slots__ = ("prompt", "enqueued_at", "loop", "future", "event", "result", "error")
+
+    def __init__(self, prompt, loop=None):
+        self.prompt = prompt
+        self.enqueued_at = time.perf_counter()
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        if self.loop is not None:
+            def resolve():
+                if self.future.done():
+                    return
+                if error is not None:
+                    self.future.set_exception(error)
+                else:
+                    self.future.set_result(result)
+            self.loop.call_soon_threadsafe(resolve)
+        else:
+            self.result, self.error = result, error
+            self.event.set()
+
+
+class GenerationScheduler:
+    def __init__(self, generate_batch, max_batch=HF_MAX_BATCH, max_wait_ms=HF_BATCH_WAIT_MS,
+                 max_queue=HF_QUEUE_SIZE):
+        self._generate_batch = generate_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self._queue_waits_ms = deque(maxlen=1024)
+        self._batch_ms = deque(maxlen=256)
+        self._worker = threading.Thread(target=self._run, name="inference", daemon=True)
+        self._worker.start()
+
+    def _submit(self, request):
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self.rejected += 1
+            raise SchedulerOverloaded("Generation queue is full")
+        self.requests += 1
+
+    async def generate(self, prompt):
+        request = _Request(prompt, asyncio.get_running_loop())
+        self._submit(request)
+        return await request.future
+
+    def generate_sync(self, prompt):
+        request = _Request(prompt)
+        self._submit(request)
+        request.event.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for request in batch:
+                self._queue_waits_ms.append((started - request.enqueued_at) * 1000)
+            self.batch_sizes[len(batch)] += 1
+
+            try:
+                outputs = self._generate_batch([request.prompt for request in batch])
+            except Exception as e:
+                self.failed_batches += 1
+                for request in batch:
+                    request.finish(error=e)
+                continue
+
+            self._batch_ms.append((time.perf_counter() - started) * 1000)
+            for request, output in zip(batch, outputs):
+                request.finish(result=output)
+
+    def stats(self):
+        waits = sorted(self._queue_waits_ms)
+        batches = sum(self.batch_sizes.values())
+        return {
+            "queue_depth": self._queue.qsize(),
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": batches,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": round(sum(size * n for size, n in self.batch_sizes.items()) / batches, 2) if batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "queue_wait_ms_p50": round(waits[len(waits) // 2], 2) if waits else 0.0,
+            "queue_wait_ms_p95": round(waits[int(len(waits) * 0.95)], 2) if waits else 0.0,
+            "avg_batch_ms": round(sum(self._batch_ms) / len(self._batch_ms), 2) if self._batch_ms else 0.0,
+        }
+
+
+def pipeline_batch_generator(pipeline, pipeline_kwargs):
+    """generate_batch callable for a transformers text-generation pipeline"""
+    tokenizer = pipeline.tokenizer
+    # Decoder-only models must be padded on the left to generate in a batch
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    def generate_batch(prompts):
+        outputs = pipeline(prompts, batch_size=len(prompts), return_full_text=False, **pipeline_kwargs)
+        return [output[0]["generated_text"] for output in outputs]
+
+    return generate_batch
+
+
+class BatchedPipelineLLM(LLM):
+    """LangChain LLM that routes every call through a GenerationScheduler"""
+
+    scheduler: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "huggingface_pipeline_batched"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        return self.scheduler.generate_sync(prompt)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        return await self.scheduler.generate(prompt)
+
+
+def batched_pipeline_llm(hf_pipeline_llm):
+    """Wrap a langchain HuggingFacePipeline so concurrent calls are batched"""
+    scheduler = GenerationScheduler(
+        pipeline_batch_generator(hf_pipeline_llm.pipeline, hf_pipeline_llm.pipeline_kwargs or {})
+    )
+    metrics.register("generation_batching", scheduler.stats)
+    return BatchedPipelineLLM(scheduler=scheduler)
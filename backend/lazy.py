@@ -0,0 +1,97 @@
+"""Lazily-initialised, background-warmable resources.
+
+Wraps a slow factory (model download, vector store load) so importing the
+module that owns it is instant. The first caller - or warm() from the app
+lifespan - builds it once on a worker thread; everyone else waits for that
+build instead of starting their own.
+
+A failed build is not retried on every call: until the backoff (doubling
+from LAZY_RETRY_SECONDS up to LAZY_RETRY_MAX_SECONDS) has passed, get()
+raises ResourceFailed straight away.
+"""
+import asyncio
+import os
+import threading
+import time
+
+LAZY_RETRY_SECONDS = float(os.getenv("LAZY_RETRY_SECONDS", "30"))
+LAZY_RETRY_MAX_SECONDS = float(os.getenv("LAZY_RETRY_MAX_SECONDS", "600"))
+
+
+class ResourceFailed(RuntimeError):
+    """The last build failed and its retry backoff has not passed yet"""
+
+
+class LazyResource:
+    def __init__(self, name, factory, retry_seconds=LAZY_RETRY_SECONDS, max_retry_seconds=LAZY_RETRY_MAX_SECONDS):
+        self.name = name
+        self._factory = factory
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._value = None
+        self.state = "cold"  # cold -> loading -> ready | failed
+        self.error = None
+        self.load_seconds = None
+
+    def _check_backoff(self):
+        if self.state == "failed" and time.monotonic() < self._retry_at:
+            raise ResourceFailed(f"{self.name} failed to load: {self.error}")
+
+    def _load(self):
+        with self._lock:
+            if self.state == "ready":
+                return
+            self._check_backoff()
+            self.state = "loading"
+            started = time.perf_counter()
+            try:
+                self._value = self._factory()
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                self.failures += 1
+                backoff = min(self.max_retry_seconds, self.retry_seconds * 2 ** (self.failures - 1))
+                self._retry_at = time.monotonic() + backoff
+                raise
+            finally:
+                self.load_seconds = round(time.perf_counter() - started, 3)
+            self.state = "ready"
+            self.error = None
+            self.failures = 0
+
+    def get(self):
+        """Return the resource, building it on this thread if nobody has yet"""
+        if self.state != "ready":
+            self._check_backoff()
+            self._load()
+        return self._value
+
+    async def aget(self):
+        """Awaitable get() that builds or waits off the event loop"""
+        if self.state == "ready":
+            return self._value
+        self._check_backoff()
+        return await asyncio.to_thread(self.get)
+
+    def warm(self):
+        """Start building in a background thread; failures are recorded, not raised"""
+        if self.state in ("ready", "loading") or (self.state == "failed" and time.monotonic() < self._retry_at):
+            return
+
+        def run():
+            try:
+                self._load()
+            except Exception:
+                pass
+
+        threading.Thread(target=run, name=f"warm-{self.name}", daemon=True).start()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
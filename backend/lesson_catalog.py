@@ -0,0 +1,76 @@
+"""In-memory lesson catalog served as pre-serialized JSON.
+
+The catalog is rebuilt from a single JOIN query whenever database.py's
+catalog version changes (create_lesson / create_question), and is tagged
+with a strong ETag so clients can revalidate with If-None-Match.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+import async_db as db
+from database import catalog_version
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    version: int
+    body: bytes
+    etag: str
+
+
+_entry = None
+
+
+def build_lessons(rows):
+    lessons = []
+    by_id = {}
+    for row in rows:
+        lesson = by_id.get(row['id'])
+        if lesson is None:
+            lesson = {
+                "id": row['id'],
+                "title": row['title'],
+                "description": row['description'],
+                "content": row['content'],
+                "questions": []
+            }
+            by_id[row['id']] = lesson
+            lessons.append(lesson)
+
+        if row['q_id'] is not None:
+            lesson["questions"].append({
+                "id": row['q_id'],
+                "question": row['question'],
+                "options": json.loads(row['options']),
+                "correctAnswer": row['correct_answer'],
+                "explanation": row['explanation']
+            })
+    return lessons
+
+
+async def get_catalog():
+    """Return the current CatalogEntry, rebuilding it if lessons changed"""
+    global _entry
+    entry = _entry
+    version = catalog_version()
+    if entry is not None and entry.version == version:
+        return entry
+
+    # Read the version before querying so a concurrent write forces a rebuild
+    rows = await db.get_lessons_with_questions()
+    payload = {"success": True, "lessons": build_lessons(rows)}
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    entry = CatalogEntry(version=version, body=body, etag=etag)
+    _entry = entry
+    return entry
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
@@ -0,0 +1,80 @@
+"""In-memory BM25 index over the RAG chunks.
+
+Built by build_vector_db.py from the same chunks as the Chroma collection
+and saved next to it as LEXICAL_INDEX_FILE (gzipped JSON). If the file is
+missing, the API rebuilds the index from the documents stored in Chroma.
+Postings are kept as compact per-term arrays of (chunk number, term count).
+"""
+import gzip
+import json
+import math
+import re
+from array import array
+from collections import Counter
+
+LEXICAL_INDEX_FILE = "bm25_index.json.gz"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its me my of on or
+our so that the their them then there these they this to was we what when where which who why will
+with you your
+""".split())
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, texts, metadatas=None, k1=1.5, b=0.75):
+        self.texts = list(texts)
+        self.metadatas = list(metadatas) if metadatas is not None else [{} for _ in self.texts]
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = array("I")
+        postings = {}
+        for number, text in enumerate(self.texts):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                docs, tfs = postings.setdefault(term, (array("I"), array("I")))
+                docs.append(number)
+                tfs.append(count)
+        self.postings = postings
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        n = len(self.texts)
+        self.idf = {term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for term, (docs, _) in postings.items()}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def search(self, query, k=10):
+        """Top-k (chunk number, score) pairs, best first"""
+        scores = {}
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            idf = self.idf[term]
+            for number, tf in zip(*entry):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[number] / self.avg_length)
+                scores[number] = scores.get(number, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, path):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "texts": self.texts, "metadatas": self.metadatas}, f)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["texts"], data["metadatas"], k1=data["k1"], b=data["b"])
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """Index every chunk stored in a Chroma collection"""
+        stored = vectorstore.get(include=["documents", "metadatas"])
+        return cls(stored["documents"], [m or {} for m in stored["metadatas"]])
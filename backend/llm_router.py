@@ -0,0 +1,291 @@
+"""Failover routing across chat model providers.
+
+Every generation runs under a deadline (LLM_TIMEOUT). Providers are tried
+in order, each behind its own circuit breaker: after LLM_BREAKER_FAILURES
+consecutive failures a provider is skipped for LLM_BREAKER_RESET seconds,
+then a single probe call decides whether it is back. A call that fails
+moves straight on to the next provider. A call that is merely slow gets a
+hedged request to the next provider once it has run longer than the
+LLM_HEDGE_PERCENTILE of that provider's recent latency; whichever answers
+first wins and the other is cancelled.
+
+Once a stream is under way it is bound to its provider, so it cannot fail
+over, but it cannot hang either: a gap of LLM_STREAM_IDLE_TIMEOUT between
+chunks, or a stream running past LLM_STREAM_TIMEOUT, ends it with
+ModelUnavailable and counts as a failure of that provider.
+
+Providers are passed in as async getters returning a LangChain model (or
+anything with ainvoke/astream), so the router can be exercised with local
+fakes.
+"""
+import asyncio
+import os
+import time
+from collections import Counter, deque
+import tracing
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_AFTER_MS = float(os.getenv("LLM_HEDGE_AFTER_MS", "4000"))
+LLM_HEDGE_MIN_SAMPLES = 20
+# A stream that goes this long without a chunk has stalled; the whole stream is capped too
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "10"))
+LLM_STREAM_TIMEOUT = float(os.getenv("LLM_STREAM_TIMEOUT", "120"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+
+class ModelUnavailable(Exception):
+    """No provider produced a response before the deadline"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"  # closed -> open -> half_open -> closed | open
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def allow(self):
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+        # Half open: one probe call at a time
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def record_cancelled(self):
+        """The call was abandoned (lost a hedge race): it proves nothing either way"""
+        self._probing = False
+
+    def status(self):
+        return {"state": self.state, "consecutive_failures": self.failures, "opens": self.opens}
+
+
+class _ProviderStats:
+    def __init__(self):
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        # Recent latency of successful calls, per kind ("invoke" = full reply, "stream" = first chunk)
+        self.latencies_ms = {"invoke": deque(maxlen=512), "stream": deque(maxlen=512)}
+
+    def percentile(self, kind, pct):
+        samples = sorted(self.latencies_ms[kind])
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class ProviderRouter:
+    def __init__(self, providers, timeout=LLM_TIMEOUT, hedge_percentile=LLM_HEDGE_PERCENTILE,
+                 hedge_after_ms=LLM_HEDGE_AFTER_MS, breakers=None,
+                 stream_idle_timeout=LLM_STREAM_IDLE_TIMEOUT, stream_timeout=LLM_STREAM_TIMEOUT):
+        # providers: ordered {name: async () -> model}, preferred first
+        self.providers = dict(providers)
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after_ms = hedge_after_ms
+        self.stream_idle_timeout = stream_idle_timeout
+        self.stream_timeout = stream_timeout
+        self.breakers = breakers or {name: CircuitBreaker() for name in self.providers}
+        self.stats = {name: _ProviderStats() for name in self.providers}
+        self.wins = Counter()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.unavailable = 0
+        self.deadline_exceeded = 0
+        self.stream_stalls = 0
+
+    def hedge_delay(self, name, kind):
+        """Seconds to wait on a provider before hedging to the next one"""
+        stats = self.stats[name]
+        if len(stats.latencies_ms[kind]) >= LLM_HEDGE_MIN_SAMPLES:
+            return stats.percentile(kind, self.hedge_percentile) / 1000
+        return self.hedge_after_ms / 1000
+
+    async def _attempt(self, name, call):
+        with tracing.span("llm.attempt", provider=name):
+            model = await self.providers[name]()
+            return await call(model)
+
+    async def _race(self, kind, call, discard=None):
+        """Run call(model) on the first available provider, hedging and failing over.
+
+        Returns the winning provider's name and its result.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        pending = {}  # task -> (provider, started, hedged)
+        remaining = list(self.providers)
+        errors = []
+
+        def launch(hedged=False):
+            """Start the next provider whose breaker allows a call; returns when to hedge it"""
+            while remaining:
+                name = remaining.pop(0)
+                if self.breakers[name].allow():
+                    break
+            else:
+                return None
+            self.stats[name].calls += 1
+            task = loop.create_task(self._attempt(name, call))
+            pending[task] = (name, loop.time(), hedged)
+            return loop.time() + self.hedge_delay(name, kind) if remaining else None
+
+        hedge_at = launch()
+        if not pending:
+            self.unavailable += 1
+            raise ModelUnavailable("All model providers are unavailable")
+        try:
+            while pending:
+                now = loop.time()
+                wait_until = min(deadline, hedge_at) if hedge_at is not None else deadline
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, wait_until - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if loop.time() >= deadline:
+                        break
+                    # Slow, not failed: ask the next provider as well
+                    racing = len(pending)
+                    hedge_at = launch(hedged=True)
+                    self.hedges += len(pending) > racing
+                    continue
+
+                winner = None
+                for task in done:
+                    name, started, hedged = pending.pop(task)
+                    stats = self.stats[name]
+                    if task.exception() is None:
+                        self.breakers[name].record_success()
+                        if winner is not None:
+                            # Two answers at once: keep the first, drop the other
+                            stats.cancelled += 1
+                            if discard:
+                                await discard(task.result())
+                            continue
+                        stats.successes += 1
+                        stats.latencies_ms[kind].append((loop.time() - started) * 1000)
+                        self.wins[name] += 1
+                        self.hedge_wins += hedged
+                        winner = name, task.result()
+                    else:
+                        stats.failures += 1
+                        self.breakers[name].record_failure()
+                        errors.append(f"{name}: {task.exception()}")
+                if winner is not None:
+                    return winner
+
+                if not pending:
+                    # Failed outright: go straight to the next provider
+                    hedge_at = launch()
+                    self.failovers += bool(pending)
+
+            self.deadline_exceeded += 1
+            for task, (name, _, _) in pending.items():
+                task.cancel()
+                self.stats[name].timeouts += 1
+                self.breakers[name].record_failure()
+                errors.append(f"{name}: no response within {self.timeout}s")
+            pending.clear()
+            raise ModelUnavailable("; ".join(errors))
+        finally:
+            # Losers of a hedge race, or everything if the caller went away
+            for task, (name, _, _) in pending.items():
+                task.cancel()
+                self.stats[name].cancelled += 1
+                self.breakers[name].record_cancelled()
+
+    async def ainvoke(self, prompt_value):
+        """The first complete response from any provider"""
+        _, response = await self._race("invoke", lambda model: model.ainvoke(prompt_value))
+        return response
+
+    async def astream(self, prompt_value):
+        """Stream from whichever provider produces a first chunk first"""
+        async def first_chunk(model):
+            iterator = model.astream(prompt_value).__aiter__()
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return None, None
+            except BaseException:
+                await iterator.aclose()
+                raise
+            return chunk, iterator
+
+        async def discard(result):
+            if result[1] is not None:
+                await result[1].aclose()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.stream_timeout
+        name, (chunk, iterator) = await self._race("stream", first_chunk, discard)
+        if iterator is None:
+            return
+        try:
+            yield chunk
+            while True:
+                timeout = min(self.stream_idle_timeout, deadline - loop.time())
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), max(0.0, timeout))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self.stream_stalls += 1
+                    self.stats[name].timeouts += 1
+                    self.breakers[name].record_failure()
+                    raise ModelUnavailable(f"{name}: stream stalled for {timeout:.1f}s") from None
+                yield chunk
+        finally:
+            await iterator.aclose()
+
+    def metrics(self):
+        return {
+            "providers": {
+                name: {
+                    "breaker": self.breakers[name].status(),
+                    "calls": stats.calls,
+                    "successes": stats.successes,
+                    "failures": stats.failures,
+                    "timeouts": stats.timeouts,
+                    "cancelled": stats.cancelled,
+                    "wins": self.wins[name],
+                    "latency_ms_p50": round(stats.percentile("invoke", 50) or 0.0, 2),
+                    "latency_ms_p95": round(stats.percentile("invoke", 95) or 0.0, 2),
+                    "first_chunk_ms_p95": round(stats.percentile("stream", 95) or 0.0, 2),
+                }
+                for name, stats in self.stats.items()
+            },
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "deadline_exceeded": self.deadline_exceeded,
+            "stream_stalls": self.stream_stalls,
+            "unavailable": self.unavailable,
+        }
@@ -1,11 +1,25 @@
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
 import json
+import time
 from models import *
 from database import *
+import async_db as db
+import lesson_catalog
+import chat_writer
+import distress_alerts
+import admission
+from llm_router import ModelUnavailable
+import chat_archive
+import metrics
+import tracing
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, page, parse_timestamp
 from auth import *
 from ai_integration import *
 
@@ -14,9 +28,18 @@ from ai_integration import *
 async def lifespan(app: FastAPI):
     # Startup: Initialize database
     init_db()
+    chat_writer.start()
+    # Load models in the background so non-AI routes serve immediately
+    warm_up()
     yield
-    # Shutdown: cleanup if needed
-    pass
+    # Shutdown: finish alerts in flight, flush queued chat history, drain database workers,
+    # write out trace spans and close pooled connections
+    await distress_alerts.drain()
+    await chat_writer.stop()
+    db.shutdown()
+    tracing.exporter.stop()
+    close_db_pool()
+    chat_archive.close_archive_pool()
 
 
 app = FastAPI(
@@ -26,6 +49,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+
+@app.exception_handler(ModelUnavailable)
+async def model_unavailable_handler(request, exc):
+    """Every model provider failed or missed the deadline"""
+    print(f"Warning: Chat model unavailable: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The chat assistant is unavailable right now, please try again shortly"},
+        headers={"Retry-After": str(admission.ADMISSION_RETRY_AFTER)}
+    )
+
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -33,15 +68,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# Outermost, so a sampled request's root span covers CORS handling and the full response body
+app.add_middleware(tracing.TraceMiddleware)
+
 
 # AUTH ROUTES
 @app.post("/api/auth/signup", response_model=AuthResponse)
 async def signup(data: SignupRequest):
     """Register a new user (parent or child)"""
     # Check if user exists
-    existing_user = get_user_by_email(data.email)
+    existing_user = await db.get_user_by_email(data.email)
     if existing_user:
         return AuthResponse(success=False, message="Email already registered")
 
@@ -51,10 +90,10 @@ async def signup(data: SignupRequest):
 
     # Hash password and create user
     password_hash = hash_password(data.password)
-    user_id = create_user(data.email, password_hash, data.role, data.name, data.age)
+    user_id = await db.create_user(data.email, password_hash, data.role, data.name, data.age)
 
     # Create token
-    token = create_token(user_id)
+    token = create_token(user_id, data.role, data.age)
 
     user = UserResponse(
         id=user_id,
@@ -70,12 +109,12 @@ async def signup(data: SignupRequest):
 @app.post("/api/auth/login", response_model=AuthResponse)
 async def login(data: LoginRequest):
     """Login existing user"""
-    user = get_user_by_email(data.email)
+    user = await db.get_user_by_email(data.email)
 
     if not user or not verify_password(data.password, user['password_hash']):
         return AuthResponse(success=False, message="Invalid email or password")
 
-    token = create_token(user['id'])
+    token = create_token(user['id'], user['role'], user['age'])
 
     user_response = UserResponse(
         id=user['id'],
@@ -92,7 +131,7 @@ async def login(data: LoginRequest):
 @app.get("/api/profile", response_model=UserResponse)
 async def get_profile(current_user=Depends(get_current_user)):
     """Get current user profile"""
-    user = get_user_by_id(current_user)
+    user = await db.get_user_by_id(current_user.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -109,12 +148,11 @@ async def get_profile(current_user=Depends(get_current_user)):
 async def get_children(current_user=Depends(get_current_user)):
     """Get all linked children profiles for parent"""
     # Verify current user is a parent
-    parent = get_user_by_id(current_user)
-    if parent['role'] != 'parent':
+    if current_user.role != 'parent':
         raise HTTPException(status_code=403, detail="Only parents can view children profiles")
 
     # Get all children linked to this parent
-    children = get_children_of_parent(current_user)
+    children = await db.get_children_of_parent(current_user.id)
 
     # Convert to list of UserResponse objects
     children_profiles = [
@@ -139,12 +177,11 @@ async def get_children(current_user=Depends(get_current_user)):
 async def link_child(data: LinkChildRequest, current_user=Depends(get_current_user)):
     """Link a child to a parent account"""
     # Verify current user is a parent
-    parent = get_user_by_id(current_user)
-    if parent['role'] != 'parent':
+    if current_user.role != 'parent':
         return LinkResponse(success=False, message="Only parents can link children")
 
     # Find child by email
-    child = get_user_by_email(data.childEmail)
+    child = await db.get_user_by_email(data.childEmail)
     if not child:
         return LinkResponse(success=False, message="Child account not found")
 
@@ -152,35 +189,66 @@ async def link_child(data: LinkChildRequest, current_user=Depends(get_current_us
         return LinkResponse(success=False, message="User is not a child account")
 
     # Create link
-    link_parent_child(current_user, child['id'])
+    await db.link_parent_child(current_user.id, child['id'])
 
     return LinkResponse(success=True, message=f"Successfully linked to {child['name']}")
 
 
 # CHAT ROUTES
+def screen_child_message(user_id, message):
+    """Check a child message for distress before generation; the parent alert is
+    written in the background while the reply is generated"""
+    detected_at = time.perf_counter()
+    distress_detected = detect_distress(message)
+    if distress_detected:
+        distress_alerts.raise_alert(user_id, message, detected_at)
+    return distress_detected
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events, slot=None):
+    # The admission slot is held until the stream ends. Starlette skips the background task
+    # when the client disconnects or the generator raises, so the stream releases it too.
+    async def guarded():
+        try:
+            async for event in events:
+                yield event
+        finally:
+            if slot:
+                slot.release()
+            await events.aclose()
+
+    return StreamingResponse(
+        guarded(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(slot.release) if slot else None
+    )
+
+
+def child_lane(distress_detected):
+    return "distress" if distress_detected else "child"
+
+
 @app.post("/api/chat/child", response_model=ChatResponse)
 async def chat_child(data: ChatRequest, current_user=Depends(get_current_user)):
     """Child chatbot endpoint"""
-    user = get_user_by_id(current_user)
-
-    if user['role'] != 'child':
+    if current_user.role != 'child':
         raise HTTPException(status_code=403, detail="This chat is only for children")
 
-    # Get AI response
-    result = await child_chatbot(data.message)
+    distress_detected = screen_child_message(current_user.id, data.message)
 
-    # Save to chat history
-    save_chat_message(current_user, data.message, result['response'], result['distressDetected'])
+    # Get AI response, once admitted (child chats are served before parent chats)
+    with await admission.acquire(current_user.id, child_lane(distress_detected), MODEL_PROVIDER):
+        result = await child_chatbot(data.message, age=current_user.age or DEFAULT_CHILD_AGE, user_id=current_user.id,
+                                     distress_detected=distress_detected)
 
-    # If distress detected, create alert for parent
-    if result['distressDetected']:
-        parent_id = get_parent_of_child(current_user)
-        if parent_id:
-            create_emergency_alert(
-                current_user,
-                f"Distress detected in chat: {data.message[:100]}",
-                "Chat conversation"
-            )
+    # Save to chat history
+    await chat_writer.enqueue(current_user.id, data.message, result['response'], distress_detected)
 
     return ChatResponse(
         success=True,
@@ -193,16 +261,18 @@ async def chat_child(data: ChatRequest, current_user=Depends(get_current_user)):
 @app.post("/api/chat/parent", response_model=ChatResponse)
 async def chat_parent(data: ChatRequest, current_user=Depends(get_current_user)):
     """Parent guidance chatbot endpoint"""
-    user = get_user_by_id(current_user)
-
-    if user['role'] != 'parent':
+    if current_user.role != 'parent':
         raise HTTPException(status_code=403, detail="This chat is only for parents")
 
-    # Get AI response
-    response = await parent_chatbot(data.message)
+    # Cached answers skip the rate limit and the model queue
+    prepared = await prepare_parent_chat(data.message)
+    response = prepared[2]
+    if response is None:
+        with await admission.acquire(current_user.id, "parent", MODEL_PROVIDER):
+            response = await parent_chatbot(data.message, prepared)
 
     # Save to chat history
-    save_chat_message(current_user, data.message, response, False)
+    await chat_writer.enqueue(current_user.id, data.message, response, False)
 
     return ChatResponse(
         success=True,
@@ -212,56 +282,146 @@ async def chat_parent(data: ChatRequest, current_user=Depends(get_current_user))
     )
 
 
+@app.post("/api/chat/child/stream")
+async def chat_child_stream(data: ChatRequest, current_user=Depends(get_current_user)):
+    """Child chatbot endpoint streaming tokens over Server-Sent Events"""
+    if current_user.role != 'child':
+        raise HTTPException(status_code=403, detail="This chat is only for children")
+
+    # Screened up front so the alert does not depend on the stream being read
+    distress_detected = screen_child_message(current_user.id, data.message)
+    slot = await admission.acquire(current_user.id, child_lane(distress_detected), MODEL_PROVIDER)
+
+    async def events():
+        parts = []
+        try:
+            async for text in child_chatbot_stream(data.message, age=current_user.age or DEFAULT_CHILD_AGE,
+                                                   user_id=current_user.id):
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            print(f"Warning: Child chat stream failed: {e}")
+            yield sse_event("error", {"success": False, "message": "Chat response failed"})
+            return
+
+        # Save to chat history; a failed or abandoned reply would replay as an empty turn
+        await chat_writer.enqueue(current_user.id, data.message, "".join(parts), distress_detected)
+
+        yield sse_event("done", {
+            "success": True,
+            "distressDetected": distress_detected,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    return sse_response(events(), slot)
+
+
+@app.post("/api/chat/parent/stream")
+async def chat_parent_stream(data: ChatRequest, current_user=Depends(get_current_user)):
+    """Parent guidance chatbot endpoint streaming tokens over Server-Sent Events"""
+    if current_user.role != 'parent':
+        raise HTTPException(status_code=403, detail="This chat is only for parents")
+
+    # Cached answers skip the rate limit and the model queue
+    prepared = await prepare_parent_chat(data.message)
+    slot = None
+    if prepared[2] is None:
+        slot = await admission.acquire(current_user.id, "parent", MODEL_PROVIDER)
+
+    async def events():
+        parts = []
+        try:
+            async for text in parent_chatbot_stream(data.message, prepared):
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            print(f"Warning: Parent chat stream failed: {e}")
+            yield sse_event("error", {"success": False, "message": "Chat response failed"})
+            return
+
+        # Save to chat history
+        await chat_writer.enqueue(current_user.id, data.message, "".join(parts), False)
+
+        yield sse_event("done", {
+            "success": True,
+            "distressDetected": False,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    return sse_response(events(), slot)
+
+
+@app.get("/api/chat/history/{child_id}")
+async def get_child_chat_history(
+    child_id: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user=Depends(get_current_user)
+):
+    """Get a linked child's chat history (parent access only), newest first"""
+    if current_user.role != 'parent':
+        raise HTTPException(status_code=403, detail="Only parents can view chat history")
+
+    if not await db.is_child_linked(current_user.id, child_id):
+        raise HTTPException(status_code=403, detail="This child is not linked to your account")
+
+    # Fetch one extra row to know whether another page exists
+    messages = await db.get_chat_history(
+        child_id,
+        since=parse_timestamp(since, "since"),
+        until=parse_timestamp(until, "until"),
+        before=decode_cursor(cursor),
+        limit=limit + 1
+    )
+    messages, next_cursor = page(messages, limit)
+
+    return {
+        "success": True,
+        "messages": [
+            {
+                "id": message['id'],
+                "message": message['message'],
+                "response": message['response'],
+                "distressDetected": bool(message['distress_detected']),
+                "createdAt": message['created_at']
+            }
+            for message in messages
+        ],
+        "nextCursor": next_cursor
+    }
+
+
 # LEARNING ROUTES
 @app.get("/api/learning/lessons")
-async def get_lessons_api():
+async def get_lessons_api(if_none_match: Optional[str] = Header(None)):
     """Get interactive safety lessons for children from database"""
-    # Fetch lessons from database
-    lessons_db = get_all_lessons()
-
-    lessons = []
-    for lesson in lessons_db:
-        # Fetch questions for this lesson
-        questions_db = get_questions_by_lesson(lesson['id'])
-
-        questions = []
-        for question in questions_db:
-            questions.append({
-                "id": question['id'],
-                "question": question['question'],
-                "options": json.loads(question['options']),
-                "correctAnswer": question['correct_answer'],
-                "explanation": question['explanation']
-            })
-
-        lessons.append({
-            "id": lesson['id'],
-            "title": lesson['title'],
-            "description": lesson['description'],
-            "content": lesson['content'],
-            "questions": questions
-        })
+    catalog = await lesson_catalog.get_catalog()
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+
+    # Client already has this version of the catalog
+    if lesson_catalog.etag_matches(if_none_match, catalog.etag):
+        return Response(status_code=304, headers=headers)
 
-    return {"success": True, "lessons": lessons}
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
 
 
 @app.post("/api/learning/submit", response_model=QuizResult)
 async def submit_quiz(data: QuizSubmission, current_user=Depends(get_current_user)):
     """Submit quiz answers and get results"""
-    user = get_user_by_id(current_user)
-
     # Verify user is a child
-    if user['role'] != 'child':
+    if current_user.role != 'child':
         raise HTTPException(status_code=403, detail="Only children can submit quizzes")
 
     # Fetch lesson from database
-    lesson = get_lesson_by_id(data.lessonId)
+    lesson = await db.get_lesson_by_id(data.lessonId)
 
     if not lesson:
         raise HTTPException(status_code=404, detail="Lesson not found")
 
     # Fetch questions for this lesson
-    questions = get_questions_by_lesson(data.lessonId)
+    questions = await db.get_questions_by_lesson(data.lessonId)
 
     if not questions:
         raise HTTPException(status_code=404, detail="No questions found for this lesson")
@@ -277,8 +437,8 @@ async def submit_quiz(data: QuizSubmission, current_user=Depends(get_current_use
     passed = correct >= (total * 0.7)  # 70% to pass
 
     # Track student progress in database
-    track_student_progress(
-        user_id=current_user,
+    await db.track_student_progress(
+        user_id=current_user.id,
         lesson_id=data.lessonId,
         score=correct,
         total_questions=total,
@@ -297,17 +457,15 @@ async def submit_quiz(data: QuizSubmission, current_user=Depends(get_current_use
 @app.post("/api/emergency/alert", response_model=EmergencyResponse)
 async def emergency_alert(data: EmergencyAlert, current_user=Depends(get_current_user)):
     """Send emergency alert to parent/trusted contacts"""
-    user = get_user_by_id(current_user)
-
     # Create alert
-    alert_id = create_emergency_alert(current_user, data.message, data.location)
+    alert_id = await db.create_emergency_alert(current_user.id, data.message, data.location)
 
     # Get parent if child
     notified = []
-    if user['role'] == 'child':
-        parent_id = get_parent_of_child(current_user)
+    if current_user.role == 'child':
+        parent_id = await db.get_parent_of_child(current_user.id)
         if parent_id:
-            parent = get_user_by_id(parent_id)
+            parent = await db.get_user_by_id(parent_id)
             notified.append(parent['email'])
 
     return EmergencyResponse(
@@ -319,21 +477,47 @@ async def emergency_alert(data: EmergencyAlert, current_user=Depends(get_current
 
 
 @app.get("/api/emergency/alerts")
-async def get_alerts(current_user=Depends(get_current_user)):
-    """Get emergency alerts (for parents)"""
-    user = get_user_by_id(current_user)
-
-    if user['role'] != 'parent':
+async def get_alerts(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user=Depends(get_current_user)
+):
+    """Get emergency alerts (for parents), newest first, one page at a time"""
+    if current_user.role != 'parent':
         raise HTTPException(status_code=403, detail="Only parents can view alerts")
 
-    alerts = get_alerts_for_parent(current_user)
+    # Fetch one extra row to know whether another page exists
+    alerts = await db.get_alerts_for_parent(
+        current_user.id,
+        since=parse_timestamp(since, "since"),
+        until=parse_timestamp(until, "until"),
+        before=decode_cursor(cursor),
+        limit=limit + 1
+    )
+    alerts, next_cursor = page(alerts, limit)
 
     return {
         "success": True,
-        "alerts": [dict(alert) for alert in alerts]
+        "alerts": [dict(alert) for alert in alerts],
+        "nextCursor": next_cursor
     }
 
 
+@app.post("/api/emergency/alerts/seen")
+async def mark_alerts_seen_api(child_id: Optional[str] = None, current_user=Depends(get_current_user)):
+    """Mark alerts as seen so they no longer count as unread on the dashboard"""
+    if current_user.role != 'parent':
+        raise HTTPException(status_code=403, detail="Only parents can mark alerts as seen")
+
+    updated = await db.mark_alerts_seen(current_user.id, child_id)
+    if child_id is not None and not updated:
+        raise HTTPException(status_code=403, detail="This child is not linked to your account")
+
+    return {"success": True}
+
+
 # RESOURCES ROUTES
 @app.get("/api/resources", response_model=ResourcesResponse)
 async def get_resources():
@@ -440,27 +624,10 @@ async def request_counseling(current_user=Depends(get_current_user)):
 
 
 # PROGRESS
-@app.get("/api/learning/progress")
-async def get_user_progress(current_user=Depends(get_current_user)):
-    """Get learning progress for current user"""
-    user = get_user_by_id(current_user)
-
-    if user['role'] != 'child':
-        raise HTTPException(status_code=403, detail="Only children can view learning progress")
-
-    # Get all progress records for this user from database
-    progress_records = get_progress_by_user(current_user)
-
-    # Get all lessons to calculate overall progress
-    all_lessons = get_all_lessons()
-    total_lessons = len(all_lessons)
-
-    # Convert progress records to list of dicts
-    progress_list = []
-    completed_lessons = set()
-
-    for record in progress_records:
-        progress_list.append({
+def format_progress_records(progress_records):
+    """Convert progress rows to list of dicts"""
+    return [
+        {
             'lesson_id': record['lesson_id'],
             'lesson_title': record['title'],
             'lesson_description': record['description'],
@@ -468,30 +635,51 @@ async def get_user_progress(current_user=Depends(get_current_user)):
             'total_questions': record['total_questions'],
             'passed': bool(record['passed']),
             'completed_at': record['completed_at']
-        })
-        if record['passed']:
-            completed_lessons.add(record['lesson_id'])
+        }
+        for record in progress_records
+    ]
 
-    # Calculate overall statistics
-    total_completed = len(completed_lessons)
-    completion_percentage = (total_completed / total_lessons * 100) if total_lessons > 0 else 0
 
-    # Calculate total correct answers
-    total_correct = sum(p['score'] for p in progress_list)
-    total_questions = sum(p['total_questions'] for p in progress_list)
+def progress_statistics(summary):
+    """Overall statistics from a get_progress_summary row"""
+    total_lessons = summary['total_lessons']
+    if summary['user_id'] is None:
+        # No quiz submitted yet
+        total_completed = total_correct = total_questions = 0
+    else:
+        total_completed = len(json.loads(summary['completed_lessons']))
+        total_correct = summary['total_correct']
+        total_questions = summary['total_attempted']
+
+    completion_percentage = (total_completed / total_lessons * 100) if total_lessons > 0 else 0
     accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
 
+    return {
+        'total_lessons': total_lessons,
+        'completed_lessons': total_completed,
+        'completion_percentage': round(completion_percentage, 1),
+        'total_correct_answers': total_correct,
+        'total_questions_attempted': total_questions,
+        'accuracy_percentage': round(accuracy, 1)
+    }
+
+
+@app.get("/api/learning/progress")
+async def get_user_progress(current_user=Depends(get_current_user)):
+    """Get learning progress for current user"""
+    if current_user.role != 'child':
+        raise HTTPException(status_code=403, detail="Only children can view learning progress")
+
+    # Progress records and pre-aggregated statistics for this user
+    progress_records, summary = await asyncio.gather(
+        db.get_progress_by_user(current_user.id),
+        db.get_progress_summary(current_user.id)
+    )
+
     return {
         'success': True,
-        'progress': progress_list,
-        'statistics': {
-            'total_lessons': total_lessons,
-            'completed_lessons': total_completed,
-            'completion_percentage': round(completion_percentage, 1),
-            'total_correct_answers': total_correct,
-            'total_questions_attempted': total_questions,
-            'accuracy_percentage': round(accuracy, 1)
-        }
+        'progress': format_progress_records(progress_records),
+        'statistics': progress_statistics(summary)
     }
 
 
@@ -499,54 +687,22 @@ async def get_user_progress(current_user=Depends(get_current_user)):
 @app.get("/api/learning/progress/{child_id}")
 async def get_child_progress(child_id: str, current_user=Depends(get_current_user)):
     """Get learning progress for a specific child (parent access only)"""
-    user = get_user_by_id(current_user)
-
     # Verify current user is a parent
-    if user['role'] != 'parent':
+    if current_user.role != 'parent':
         raise HTTPException(status_code=403, detail="Only parents can view child progress")
 
     # Verify the child is linked to this parent
-    children = get_children_of_parent(current_user)
-    child_ids = [child['id'] for child in children]
-
-    if child_id not in child_ids:
+    if not await db.is_child_linked(current_user.id, child_id):
         raise HTTPException(status_code=403, detail="This child is not linked to your account")
 
     # Get child info
-    child = get_user_by_id(child_id)
-
-    # Get progress records for this child
-    progress_records = get_progress_by_user(child_id)
-
-    # Get all lessons to calculate overall progress
-    all_lessons = get_all_lessons()
-    total_lessons = len(all_lessons)
-
-    # Convert progress records to list of dicts
-    progress_list = []
-    completed_lessons = set()
-
-    for record in progress_records:
-        progress_list.append({
-            'lesson_id': record['lesson_id'],
-            'lesson_title': record['title'],
-            'lesson_description': record['description'],
-            'score': record['score'],
-            'total_questions': record['total_questions'],
-            'passed': bool(record['passed']),
-            'completed_at': record['completed_at']
-        })
-        if record['passed']:
-            completed_lessons.add(record['lesson_id'])
-
-    # Calculate overall statistics
-    total_completed = len(completed_lessons)
-    completion_percentage = (total_completed / total_lessons * 100) if total_lessons > 0 else 0
+    child = await db.get_user_by_id(child_id)
 
-    # Calculate total correct answers
-    total_correct = sum(p['score'] for p in progress_list)
-    total_questions = sum(p['total_questions'] for p in progress_list)
-    accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
+    # Progress records and pre-aggregated statistics for this child
+    progress_records, summary = await asyncio.gather(
+        db.get_progress_by_user(child_id),
+        db.get_progress_summary(child_id)
+    )
 
     return {
         'success': True,
@@ -555,15 +711,38 @@ async def get_child_progress(child_id: str, current_user=Depends(get_current_use
             'name': child['name'],
             'age': child['age']
         },
-        'progress': progress_list,
-        'statistics': {
-            'total_lessons': total_lessons,
-            'completed_lessons': total_completed,
-            'completion_percentage': round(completion_percentage, 1),
-            'total_correct_answers': total_correct,
-            'total_questions_attempted': total_questions,
-            'accuracy_percentage': round(accuracy, 1)
+        'progress': format_progress_records(progress_records),
+        'statistics': progress_statistics(summary)
+    }
+
+
+# PARENT DASHBOARD - All linked children at once
+@app.get("/api/parent/dashboard")
+async def get_parent_dashboard_api(current_user=Depends(get_current_user)):
+    """Profile, progress statistics and unseen alert count for every linked child"""
+    if current_user.role != 'parent':
+        raise HTTPException(status_code=403, detail="Only parents can view the dashboard")
+
+    rows = await db.get_parent_dashboard(current_user.id)
+
+    children = [
+        {
+            'id': row['id'],
+            'email': row['email'],
+            'name': row['name'],
+            'age': row['age'],
+            'statistics': progress_statistics(row),
+            'last_activity': row['last_activity'],
+            'unread_alerts': row['unread_alerts']
         }
+        for row in rows
+    ]
+
+    return {
+        'success': True,
+        'count': len(children),
+        'unread_alerts': sum(child['unread_alerts'] for child in children),
+        'children': children
     }
 
 
@@ -577,5 +756,39 @@ async def root():
     }
 
 
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Ready once the LLM is loaded; 503 while it is still warming up.
+
+    RAG is optional (chat answers without it), so a vector store or embedding
+    model that is not loaded only marks the service degraded.
+    """
+    components = ai_status()
+    if components["llm"]["state"] != "ready":
+        status = "starting"
+    elif all(component["state"] == "ready" for component in components.values()):
+        status = "ready"
+    else:
+        status = "degraded"
+    return JSONResponse(
+        status_code=503 if status == "starting" else 200,
+        content={"status": status, "components": components}
+    )
+
+
+@app.get("/api/metrics")
+async def get_metrics(x_metrics_token: Optional[str] = Header(None)):
+    """In-process performance counters, for operators holding METRICS_TOKEN"""
+    if not metrics.authorized(x_metrics_token):
+        raise HTTPException(status_code=403, detail="A valid X-Metrics-Token header is required")
+    return {"success": True, "metrics": metrics.snapshot()}
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""Tiny in-process metrics registry.
+
+Components register a callable returning a dict of their current numbers;
+GET /api/metrics returns a snapshot of all of them to callers presenting
+METRICS_TOKEN; with no token configured the endpoint is disabled.
+"""
+import hmac
+import os
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+_sources = {}
+
+
+def register(name, source):
+    _sources[name] = source
+
+
+def snapshot():
+    return {name: source() for name, source in _sources.items()}
+
+
+def authorized(token):
+    """Whether token unlocks the metrics endpoint"""
+    return bool(METRICS_TOKEN) and token is not None and hmac.compare_digest(token, METRICS_TOKEN)
@@ -0,0 +1,265 @@
+"""Versioned schema migrations for app.db.
+
+Each step runs once, in order, in its own write-locked (BEGIN IMMEDIATE)
+transaction together with the schema_version row that records it: sqlite3
+would otherwise autocommit each DDL statement, and a step failing halfway
+would leave a partial schema behind. Steps must be idempotent so a database created
+before versioning existed (tables but no schema_version row) upgrades
+cleanly.
+
+That hot queries are served from an index is checked by
+tests/test_query_plans.py against the statements database.py really runs.
+
+    python migrations.py           # apply pending migrations
+    python migrations.py --backfill-progress   # rebuild progress_summary
+"""
+import json
+from datetime import datetime
+
+
+def _initial_schema(db):
+    # Users table
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            email TEXT UNIQUE,
+            password_hash TEXT,
+            role TEXT,
+            name TEXT,
+            age INTEGER
+        )
+    """)
+
+    # Parent-Child relationships
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS parent_child_links (
+            id TEXT PRIMARY KEY,
+            parent_id TEXT,
+            child_id TEXT,
+            created_at TEXT,
+            FOREIGN KEY (parent_id) REFERENCES users(id),
+            FOREIGN KEY (child_id) REFERENCES users(id)
+        )
+    """)
+
+    # Emergency alerts
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS emergency_alerts (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            message TEXT,
+            location TEXT,
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Chat history
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            message TEXT,
+            response TEXT,
+            distress_detected INTEGER,
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Lessons table
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS lessons (
+            id TEXT PRIMARY KEY,
+            title TEXT,
+            description TEXT,
+            content TEXT,
+            created_at TEXT
+        )
+    """)
+
+    # Questions table
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS questions (
+            id TEXT PRIMARY KEY,
+            lesson_id TEXT,
+            question TEXT,
+            options TEXT,
+            correct_answer INTEGER,
+            explanation TEXT,
+            FOREIGN KEY (lesson_id) REFERENCES lessons(id)
+        )
+    """)
+
+    # Student progress table
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS student_progress (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            lesson_id TEXT,
+            score INTEGER,
+            total_questions INTEGER,
+            passed INTEGER,
+            completed_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (lesson_id) REFERENCES lessons(id)
+        )
+    """)
+
+
+def _hot_lookup_indexes(db):
+    # get_parent_of_child
+    db.execute("CREATE INDEX IF NOT EXISTS idx_links_child ON parent_child_links (child_id, parent_id)")
+    # get_children_of_parent, get_alerts_for_parent
+    db.execute("CREATE INDEX IF NOT EXISTS idx_links_parent ON parent_child_links (parent_id, child_id)")
+    # get_alerts_for_parent ORDER BY created_at
+    db.execute("CREATE INDEX IF NOT EXISTS idx_alerts_user_created ON emergency_alerts (user_id, created_at)")
+    # get_progress_by_user, get_student_progress
+    db.execute("CREATE INDEX IF NOT EXISTS idx_progress_user_lesson ON student_progress (user_id, lesson_id)")
+    # get_questions_by_lesson
+    db.execute("CREATE INDEX IF NOT EXISTS idx_questions_lesson ON questions (lesson_id)")
+
+
+def backfill_progress_summary(db):
+    """Recompute every user's progress_summary row from student_progress"""
+    summaries = {}
+    rows = db.execute(
+        """SELECT user_id, lesson_id, score, total_questions, passed, completed_at
+           FROM student_progress"""
+    )
+    for row in rows:
+        summary = summaries.setdefault(row['user_id'], {
+            "completed": set(), "correct": 0, "attempted": 0, "attempts": 0, "last": None
+        })
+        summary["correct"] += row['score'] or 0
+        summary["attempted"] += row['total_questions'] or 0
+        summary["attempts"] += 1
+        if row['passed']:
+            summary["completed"].add(row['lesson_id'])
+        if summary["last"] is None or (row['completed_at'] or "") > summary["last"]:
+            summary["last"] = row['completed_at']
+
+    db.execute("DELETE FROM progress_summary")
+    db.executemany(
+        "INSERT INTO progress_summary VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (user_id, json.dumps(sorted(s["completed"])), s["correct"], s["attempted"],
+             s["attempts"], s["last"])
+            for user_id, s in summaries.items()
+        ]
+    )
+    return len(summaries)
+
+
+def _progress_summary(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS progress_summary (
+            user_id TEXT PRIMARY KEY,
+            completed_lessons TEXT,
+            total_correct INTEGER,
+            total_attempted INTEGER,
+            attempts INTEGER,
+            last_activity TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    backfill_progress_summary(db)
+
+
+def _keyset_pagination_indexes(db):
+    # (created_at, id) keyset pages for alerts and chat history, per user
+    db.execute("DROP INDEX IF EXISTS idx_alerts_user_created")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_alerts_user_created_id ON emergency_alerts (user_id, created_at, id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_chat_user_created_id ON chat_history (user_id, created_at, id)")
+
+
+def _alerts_seen_at(db):
+    # When the parent last marked this child's alerts as seen (NULL = never)
+    columns = [row[1] for row in db.execute("PRAGMA table_info(parent_child_links)")]
+    if "alerts_seen_at" not in columns:
+        db.execute("ALTER TABLE parent_child_links ADD COLUMN alerts_seen_at TEXT")
+
+
+def _chat_retention_index(db):
+    # chat_archive scans the oldest chat_history rows first
+    db.execute("CREATE INDEX IF NOT EXISTS idx_chat_created ON chat_history (created_at, id)")
+
+
+def _conversation_summaries(db):
+    # Rolling summary of each user's older chat turns, for conversation memory
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            user_id TEXT PRIMARY KEY,
+            summary TEXT,
+            through_created_at TEXT,
+            through_id TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+
+# Ordered list of (version, description, step). Append only - never edit or
+# reorder a step that has shipped; add a new one instead.
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "indexes for hot lookups", _hot_lookup_indexes),
+    (3, "per-user progress summary", _progress_summary),
+    (4, "keyset pagination indexes", _keyset_pagination_indexes),
+    (5, "alerts seen marker on parent-child links", _alerts_seen_at),
+    (6, "chat history retention index", _chat_retention_index),
+    (7, "conversation summaries", _conversation_summaries),
+]
+
+
+def current_version(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+    row = db.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(db):
+    """Apply all pending migrations and return the resulting version.
+
+    Safe to run from several processes at once (e.g. uvicorn workers): each
+    step takes the write lock with BEGIN IMMEDIATE and re-reads the version
+    under it, so a step another process applied meanwhile is skipped.
+    """
+    version = current_version(db)
+    if db.in_transaction:
+        db.commit()
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            version = current_version(db)
+            if step_version <= version:
+                db.commit()
+                continue
+            step(db)
+            db.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (step_version, description, datetime.utcnow().isoformat())
+            )
+        except BaseException:
+            db.rollback()
+            raise
+        db.commit()
+        version = step_version
+    return version
+
+if __name__ == '__main__':
+    import sys
+    from database import get_db
+
+    with get_db() as db:
+        print(f"Schema version: {migrate(db)}")
+        if "--backfill-progress" in sys.argv:
+            print(f"✓ Rebuilt progress summary for {backfill_progress_summary(db)} users")
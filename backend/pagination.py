@@ -0,0 +1,49 @@
+"""Keyset (cursor) pagination helpers for newest-first listings.
+
+A cursor is the (created_at, id) of the last row on the previous page,
+encoded as an opaque URL-safe token.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['created_at'], row['id']], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return str(created_at), str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_timestamp(value, name):
+    """Normalise an ISO-8601 query parameter to the naive-UTC format stored in the database"""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid '{name}' timestamp")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def page(rows, limit):
+    """Split limit+1 fetched rows into (page rows, next cursor or None)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
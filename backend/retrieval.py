@@ -0,0 +1,167 @@
+"""Off-loop RAG retrieval with per-stage deadlines.
+
+The Chroma search is synchronous, so it runs on a small dedicated thread
+pool instead of the event loop. Each stage has its own timeout; when one
+is exceeded the caller gets no context rather than a stalled request (the
+worker thread finishes in the background, and the pool bound keeps such
+stragglers from piling up).
+
+HybridRetriever adds an in-memory BM25 index over the same chunks and fuses
+the two rankings with reciprocal-rank fusion. When BM25 alone is decisive
+the query embedding is skipped; when the embedding or vector search fails,
+the lexical hits are used on their own.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+# Candidates taken from each retriever before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Lexical-only fast path: the best BM25 score is high and well ahead of the next
+BM25_DECISIVE_SCORE = float(os.getenv("BM25_DECISIVE_SCORE", "8"))
+BM25_DECISIVE_RATIO = float(os.getenv("BM25_DECISIVE_RATIO", "1.5"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "5"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "3"))
+
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+stage_stats = {"embed": StageStats(), "lexical": StageStats(), "search": StageStats()}
+lexical_fast_path = 0
+
+
+async def run_stage(name, awaitable, timeout):
+    """Await one retrieval stage under its deadline; None on timeout or failure"""
+    stats = stage_stats[name]
+    started = time.perf_counter()
+    with tracing.span(f"rag.{name}") as stage_span:
+        try:
+            result = await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            stage_span.set(outcome="timeout")
+            print(f"Warning: RAG {name} stage timed out after {timeout}s")
+            return None
+        except Exception as e:
+            stats.errors += 1
+            stage_span.set(outcome="error", error=str(e))
+            print(f"Warning: RAG {name} stage failed: {e}")
+            return None
+    stats.record((time.perf_counter() - started) * 1000)
+    return result
+
+
+def retrieval_stats():
+    stats = {name: stats.as_dict() for name, stats in stage_stats.items()}
+    stats["lexical_fast_path"] = lexical_fast_path
+    return stats
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked lists of keys: score = sum of 1 / (k + rank) over the lists"""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class VectorRetriever:
+    """Top-k similarity search over a vector store, built once and reused"""
+
+    def __init__(self, vectorstore, k=RETRIEVAL_K, workers=RETRIEVAL_WORKERS):
+        self.vectorstore = vectorstore
+        self.k = k
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval")
+
+    def search(self, query_vector):
+        return self.vectorstore.similarity_search_by_vector(query_vector, k=self.k)
+
+    async def asearch(self, query_vector, timeout=SEARCH_TIMEOUT):
+        loop = asyncio.get_running_loop()
+        return await run_stage(
+            "search", loop.run_in_executor(self._executor, self.search, query_vector), timeout
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class HybridRetriever(VectorRetriever):
+    """BM25 plus vector search, fused with reciprocal-rank fusion.
+
+    lexical() runs first, in-process; when its best hit is decisive the
+    caller can skip the query embedding and call asearch(None, hits).
+    """
+
+    def __init__(self, vectorstore, lexical_index, k=RETRIEVAL_K, candidates=RETRIEVAL_CANDIDATES,
+                 workers=RETRIEVAL_WORKERS):
+        super().__init__(vectorstore, k, workers)
+        self.lexical_index = lexical_index
+        self.candidates = candidates
+
+    def lexical(self, query):
+        started = time.perf_counter()
+        with tracing.span("rag.lexical") as lexical_span:
+            hits = self.lexical_index.search(query, self.candidates)
+            lexical_span.set(hits=len(hits), top_score=round(hits[0][1], 3) if hits else 0.0)
+        stage_stats["lexical"].record((time.perf_counter() - started) * 1000)
+        return hits
+
+    def decisive(self, hits, min_score=BM25_DECISIVE_SCORE, ratio=BM25_DECISIVE_RATIO):
+        """True when the lexical hits are good enough to skip vector search"""
+        global lexical_fast_path
+        if not hits or hits[0][1] < min_score:
+            return False
+        if len(hits) > 1 and hits[0][1] < ratio * hits[1][1]:
+            return False
+        lexical_fast_path += 1
+        return True
+
+    def _document(self, number):
+        from langchain_core.documents import Document
+
+        return Document(page_content=self.lexical_index.texts[number],
+                        metadata=self.lexical_index.metadatas[number])
+
+    def search(self, query_vector):
+        return self.vectorstore.similarity_search_by_vector(query_vector, k=self.candidates)
+
+    async def asearch(self, query_vector, lexical_hits=(), timeout=SEARCH_TIMEOUT, k=None):
+        """Top-k chunks; lexical hits only when there is no query vector"""
+        k = k or self.k
+        lexical_docs = [self._document(number) for number, _ in lexical_hits]
+        if query_vector is None:
+            return lexical_docs[:k]
+
+        vector_docs = await super().asearch(query_vector, timeout) or []
+        by_text = {doc.page_content: doc for doc in lexical_docs + vector_docs}
+        fused = reciprocal_rank_fusion([[doc.page_content for doc in vector_docs],
+                                        [doc.page_content for doc in lexical_docs]])
+        return [by_text[text] for text in fused[:k]]
@@ -0,0 +1,127 @@
+"""Semantic response cache for the parent chatbot.
+
+Answers are stored against the normalised question text and its embedding.
+A new question is served from the cache when it matches a stored one
+exactly (after normalisation) or when the cosine similarity of the
+embeddings is at least the threshold. Entries expire after a TTL and the
+least recently used are evicted beyond max_entries. clear() is called
+when the vector store is rebuilt, since cached answers embed old context.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s']")
+
+
+def normalize_query(text):
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else None
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.92, max_entries=512, ttl=86400.0, max_response_chars=8000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_response_chars = max_response_chars
+        self._lock = threading.Lock()
+        # key -> (vector or None, response, expires_at)
+        self._entries = OrderedDict()
+        # Stacked unit vectors of entries that have one, rebuilt lazily after writes
+        self._matrix = None
+        self._matrix_keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _expire(self, now):
+        expired = [key for key, (_, _, expires) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _hit(self, key):
+        self._entries.move_to_end(key)
+        return self._entries[key][1]
+
+    def get_exact(self, key):
+        """Cached response for an identical normalised question, without embedding it"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                return None
+            self.exact_hits += 1
+            return self._hit(key)
+
+    def get_similar(self, vector):
+        """Cached response for the most similar stored question above the threshold.
+
+        Pass vector=None when no embedding is available to just record the miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self._expire(now)
+            if self._matrix is None:
+                self._matrix_keys = [key for key, entry in self._entries.items() if entry[0] is not None]
+                self._matrix = (np.stack([self._entries[key][0] for key in self._matrix_keys])
+                                if self._matrix_keys else None)
+            if self._matrix is not None:
+                query = _unit(vector)
+                scores = self._matrix @ query if query is not None else np.zeros(1)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.semantic_hits += 1
+                    return self._hit(self._matrix_keys[best])
+            self.misses += 1
+            return None
+
+    def store(self, key, vector, response):
+        if len(response) > self.max_response_chars:
+            return
+        if vector is not None:
+            vector = _unit(vector)
+        with self._lock:
+            self._entries[key] = (vector, response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def stats(self):
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "capacity": self.max_entries,
+            "threshold": self.threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
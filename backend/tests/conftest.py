@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Offline model for anything that imports ai_integration / main
+os.environ.setdefault("MODEL_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "fixed:1")
+os.environ.setdefault("FAKE_LLM_TOKENS_PER_SEC", "10000")
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """A migrated throwaway app.db (and chat archive) in place of the real ones"""
+    import chat_archive
+    import database
+
+    database.close_db_pool()
+    chat_archive.close_archive_pool()
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "app.db"))
+    monkeypatch.setattr(chat_archive, "CHAT_ARCHIVE_DB", str(tmp_path / "chat_archive.db"))
+    database.init_db()
+    yield database
+    database.close_db_pool()
+    chat_archive.close_archive_pool()
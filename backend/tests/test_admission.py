@@ -0,0 +1,133 @@
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+
+import admission
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_release_is_idempotent_and_hands_slot_to_waiter():
+    async def scenario():
+        controller = admission.AdmissionController("test", max_concurrent=1, max_queue=4, queue_timeout=1)
+        slot = await controller.acquire("parent")
+        waiter = asyncio.create_task(controller.acquire("child"))
+        await asyncio.sleep(0)
+        slot.release()
+        slot.release()
+        second = await waiter
+        assert controller.stats()["active"] == 1
+        second.release()
+        assert controller.stats()["active"] == 0
+
+    run(scenario())
+
+
+def test_background_work_is_shed_for_chat_requests():
+    async def scenario():
+        controller = admission.AdmissionController("test", max_concurrent=1, max_queue=1, queue_timeout=1)
+        slot = await controller.acquire("child")
+        background = asyncio.create_task(controller.acquire("background"))
+        await asyncio.sleep(0)
+        child = asyncio.create_task(controller.acquire("child"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as shed:
+            await background
+        assert shed.value.status_code == 503
+        slot.release()
+        (await child).release()
+        assert controller.rejected["shed"] == 1
+
+    run(scenario())
+
+
+def test_background_lane_is_not_rate_limited(monkeypatch):
+    monkeypatch.setattr(admission, "rate_limiter", admission.RateLimiter(rate_per_minute=1, burst=1))
+    monkeypatch.setattr(admission, "_controllers", {})
+
+    async def scenario():
+        for _ in range(3):
+            (await admission.acquire(None, "background", "test")).release()
+        (await admission.acquire("user", "parent", "test")).release()
+        with pytest.raises(HTTPException) as limited:
+            await admission.acquire("user", "parent", "test")
+        assert limited.value.status_code == 429
+
+    run(scenario())
+
+
+def test_distress_lane_has_its_own_larger_bucket(monkeypatch):
+    limiter = admission.RateLimiter(rate_per_minute=1, burst=1, lane_limits={"distress": (1, 3)})
+    monkeypatch.setattr(admission, "rate_limiter", limiter)
+    monkeypatch.setattr(admission, "_controllers", {})
+
+    async def scenario():
+        (await admission.acquire("user", "child", "test")).release()
+        for _ in range(3):
+            (await admission.acquire("user", "distress", "test")).release()
+        # Flagging every message does not lift the limit
+        with pytest.raises(HTTPException) as limited:
+            await admission.acquire("user", "distress", "test")
+        assert limited.value.status_code == 429
+        assert limiter.limited == {"distress": 1}
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("failure", ["disconnect", "generator_error"])
+def test_aborted_stream_releases_its_slot(failure):
+    main = pytest.importorskip("main")
+
+    async def scenario():
+        controller = admission.AdmissionController("test", max_concurrent=1, max_queue=1, queue_timeout=1)
+        slot = await controller.acquire("parent")
+
+        async def events():
+            yield main.sse_event("token", {"text": "hello"})
+            if failure == "generator_error":
+                raise RuntimeError("model failed mid-stream")
+            yield main.sse_event("token", {"text": "world"})
+
+        async def receive():
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            if failure == "disconnect" and message["type"] == "http.response.body":
+                raise OSError("client went away")
+
+        response = main.sse_response(events(), slot)
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "path": "/"}
+        with pytest.raises(Exception):
+            await response(scope, receive, send)
+        del response
+        gc.collect()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert controller.stats()["active"] == 0
+
+    run(scenario())
+
+
+def test_conversation_summary_waits_for_a_background_slot(monkeypatch):
+    ai_integration = pytest.importorskip("ai_integration")
+    controller = admission.AdmissionController("fake", max_concurrent=1, max_queue=4, queue_timeout=5)
+    monkeypatch.setattr(admission, "_controllers", {ai_integration.MODEL_PROVIDER: controller})
+
+    async def scenario():
+        chat = await controller.acquire("child")
+        fold = asyncio.create_task(ai_integration.summarize_conversation(
+            "", [{"message": "hi", "response": "hello"}]))
+        await asyncio.sleep(0.05)
+        assert controller.stats()["queued_by_lane"] == {"background": 1}
+        chat.release()
+        assert await fold
+        assert controller.stats()["active"] == 0
+        assert controller.admitted["background"] == 1
+
+    run(scenario())
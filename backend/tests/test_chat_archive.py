@@ -0,0 +1,42 @@
+import chat_archive
+import pytest
+
+
+def seed_history(database, count=3):
+    user_id = database.create_user("child@example.com", "hash", "child", "Child", 8)
+    database.save_chat_messages([
+        (f"m{i}", user_id, f"message {i}", f"response {i}", 0, f"2020-01-0{i + 1}T00:00:00")
+        for i in range(count)
+    ])
+    return user_id
+
+
+def history_ids(user_id):
+    return [row['id'] for row in chat_archive.get_chat_history(user_id)]
+
+
+def test_archive_moves_rows_and_history_reads_both_tiers(temp_db):
+    user_id = seed_history(temp_db)
+    temp_db.save_chat_messages([("new", user_id, "hi", "hello", 0, "2099-01-01T00:00:00")])
+
+    assert chat_archive.archive_older_than(days=90) == 3
+    assert history_ids(user_id) == ["new", "m2", "m1", "m0"]
+    assert temp_db.get_chat_history(user_id) and len(temp_db.get_chat_history(user_id)) == 1
+
+
+def test_interrupted_archive_run_is_not_archived_twice(temp_db, monkeypatch):
+    user_id = seed_history(temp_db)
+
+    def crash(ids):
+        raise RuntimeError("killed between archive commit and delete")
+
+    # First run dies after the block is committed but before the hot rows are deleted
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(chat_archive, "_delete_hot", crash)
+        chat_archive.archive_older_than(days=90)
+
+    assert chat_archive.archive_older_than(days=90) == 3
+    assert history_ids(user_id) == ["m2", "m1", "m0"]
+    with chat_archive.get_archive_pool().connection() as archive:
+        assert archive.execute("SELECT SUM(row_count) FROM chat_archive_blocks").fetchone()[0] == 3
+
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+import httpx
+
+import auth
+import main
+
+
+def post(path, token, json):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=json, headers={"Authorization": f"Bearer {token}"})
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def fresh_admission(monkeypatch):
+    """Rate buckets and provider queues of their own for each test"""
+    monkeypatch.setattr(main.admission, "rate_limiter", main.admission.RateLimiter())
+    monkeypatch.setattr(main.admission, "_controllers", {})
+
+
+@pytest.fixture
+def chat_calls(monkeypatch):
+    calls = []
+
+    async def child_chatbot(message, age=None, user_id=None, distress_detected=None):
+        calls.append(age)
+        return {"response": "hi", "distressDetected": False}
+
+    async def child_chatbot_stream(message, age=None, user_id=None):
+        calls.append(age)
+        yield "hi"
+
+    async def enqueue(*args):
+        pass
+
+    monkeypatch.setattr(main, "child_chatbot", child_chatbot)
+    monkeypatch.setattr(main, "child_chatbot_stream", child_chatbot_stream)
+    monkeypatch.setattr(main.chat_writer, "enqueue", enqueue)
+    return calls
+
+
+@pytest.mark.parametrize("path", ["/api/chat/child", "/api/chat/child/stream"])
+@pytest.mark.parametrize("age, expected", [(7, 7), (None, main.DEFAULT_CHILD_AGE)])
+def test_child_chat_uses_age_from_token(chat_calls, path, age, expected):
+    token = auth.create_token("child-1", "child", age)
+    response = post(path, token, {"message": "What is a good touch?"})
+    assert response.status_code == 200
+    assert chat_calls == [expected]
+
+
+def test_only_parents_can_mark_alerts_seen():
+    response = post("/api/emergency/alerts/seen", auth.create_token("child-1", "child", 7), None)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Only parents can mark alerts as seen"
+
+
+def get_metrics(headers):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/metrics", headers=headers)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("configured, headers, status", [
+    ("", {}, 403),
+    ("", {"X-Metrics-Token": ""}, 403),
+    ("s3cret", {}, 403),
+    ("s3cret", {"X-Metrics-Token": "wrong"}, 403),
+    ("s3cret", {"Authorization": f"Bearer {auth.create_token('parent-1', 'parent')}"}, 403),
+    ("s3cret", {"X-Metrics-Token": "s3cret"}, 200),
+])
+def test_metrics_require_the_configured_token(monkeypatch, configured, headers, status):
+    monkeypatch.setattr(main.metrics, "METRICS_TOKEN", configured)
+    assert get_metrics(headers).status_code == status
+
+
+@pytest.mark.parametrize("path", ["/api/chat/parent", "/api/chat/parent/stream"])
+def test_cached_parent_answers_skip_admission(monkeypatch, path):
+    monkeypatch.setattr(main.admission, "rate_limiter", main.admission.RateLimiter(rate_per_minute=1, burst=1))
+    monkeypatch.setattr(main.chat_writer, "enqueue", lambda *args: asyncio.sleep(0))
+    cached = {"value": "cached answer"}
+
+    async def prepare_parent_chat(message):
+        if cached["value"] is not None:
+            return "key", None, cached["value"], None
+        return "key", None, None, {"message": message, "context": ""}
+
+    async def parent_chatbot(message, prepared=None):
+        return "fresh answer"
+
+    async def parent_chatbot_stream(message, prepared=None):
+        yield prepared[2] or "fresh answer"
+
+    monkeypatch.setattr(main, "prepare_parent_chat", prepare_parent_chat)
+    monkeypatch.setattr(main, "parent_chatbot", parent_chatbot)
+    monkeypatch.setattr(main, "parent_chatbot_stream", parent_chatbot_stream)
+    token = auth.create_token("parent-1", "parent")
+
+    for _ in range(5):
+        response = post(path, token, {"message": "How do I talk about body safety?"})
+        assert response.status_code == 200
+        assert "cached answer" in response.text
+    # A cache miss still goes through the rate limit
+    cached["value"] = None
+    assert post(path, token, {"message": "Something new"}).status_code == 200
+    assert post(path, token, {"message": "Something else"}).status_code == 429
+
+
+def get(path):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("llm, rag, status, code", [
+    ("ready", "ready", "ready", 200),
+    ("ready", "failed", "degraded", 200),
+    ("ready", "cold", "degraded", 200),
+    ("loading", "ready", "starting", 503),
+    ("failed", "failed", "starting", 503),
+])
+def test_readiness_depends_on_the_llm_only(monkeypatch, llm, rag, status, code):
+    def component(state):
+        return {"state": state, "load_seconds": None, "error": None}
+
+    monkeypatch.setattr(main, "ai_status", lambda: {
+        "llm": component(llm), "embeddings": component(rag), "vectorstore": component(rag)})
+    response = get("/health/ready")
+    assert response.status_code == code
+    assert response.json()["status"] == status
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_child_stream_saves_only_a_completed_reply(monkeypatch, fails):
+    saved = []
+
+    async def child_chatbot_stream(message, age=None, user_id=None):
+        yield "partial"
+        if fails:
+            raise RuntimeError("provider stalled")
+        yield " reply"
+
+    async def enqueue(user_id, message, response, distress):
+        saved.append(response)
+
+    monkeypatch.setattr(main, "child_chatbot_stream", child_chatbot_stream)
+    monkeypatch.setattr(main.chat_writer, "enqueue", enqueue)
+    response = post("/api/chat/child/stream", auth.create_token("child-1", "child", 7), {"message": "Hi"})
+    assert response.status_code == 200
+    assert ("event: error" in response.text) == fails
+    assert saved == ([] if fails else ["partial reply"])
@@ -0,0 +1,48 @@
+import asyncio
+import sqlite3
+
+import chat_writer
+
+
+def test_transient_write_failure_is_retried_not_dropped(temp_db, monkeypatch):
+    save = chat_writer.db.save_chat_messages
+    failures = [sqlite3.OperationalError("database is locked")] * 2
+
+    async def flaky_save(rows):
+        if failures:
+            raise failures.pop()
+        return await save(rows)
+
+    monkeypatch.setattr(chat_writer.db, "save_chat_messages", flaky_save)
+    writer = chat_writer.ChatHistoryWriter(flush_rows=2, flush_ms=10, attempts=3, retry_delay=0.001)
+
+    async def run():
+        writer.start()
+        for i in range(3):
+            await writer.enqueue("child-1", f"message {i}", "reply")
+        await writer.stop()
+
+    asyncio.run(run())
+    assert writer.rows_failed == 0 and writer.retries == 2
+    assert len(temp_db.get_chat_history("child-1", limit=10)) == 3
+
+
+def test_batch_counted_failed_after_last_attempt(monkeypatch):
+    calls = []
+
+    async def broken_save(rows):
+        calls.append(rows)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(chat_writer.db, "save_chat_messages", broken_save)
+    writer = chat_writer.ChatHistoryWriter(attempts=3, retry_delay=0.001)
+    asyncio.run(writer.enqueue("child-1", "hello", "reply"))
+    assert len(calls) == 3
+    assert writer.rows_failed == 1
+
+
+def test_retried_batch_is_not_written_twice(temp_db):
+    row = ("chat-1", "child-1", "hello", "reply", 0, "2026-01-01T00:00:00")
+    temp_db.save_chat_messages([row])
+    temp_db.save_chat_messages([row])
+    assert len(temp_db.get_chat_history("child-1", limit=10)) == 1
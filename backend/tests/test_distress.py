@@ -0,0 +1,59 @@
+"""Distress detection on the labelled corpus in distress_corpus.py.
+
+A missed alert costs more than a needless one, so recall has the higher
+floor; everyday uses of feeling words count against precision.
+"""
+import pytest
+
+from distress import DistressDetector
+from distress_corpus import DISTRESS_CORPUS
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return DistressDetector()
+
+
+def test_corpus_precision_and_recall(detector):
+    tp = fp = fn = 0
+    for text, expected in DISTRESS_CORPUS:
+        found = detector.scan(text).detected
+        tp += found and expected
+        fp += found and not expected
+        fn += expected and not found
+    assert tp / (tp + fn) >= 0.95
+    assert tp / (tp + fp) >= 0.9
+
+
+@pytest.mark.parametrize("message", [
+    "I feel unsafe", "I am terrified", "keep it a secret", "he keeps this secret from mom",
+    "I am feeling uncomfortable.", "I'm frightened",
+])
+def test_strong_feelings_and_secrets_fire_alone(detector, message):
+    assert detector.scan(message).detected
+
+
+@pytest.mark.parametrize("message", [
+    "I hurt my knee", "I'm scared of the dark", "my brother is a bully", "I'm afraid of dogs",
+])
+def test_single_ambiguous_word_does_not_fire(detector, message):
+    assert not detector.scan(message).detected
+
+
+@pytest.mark.parametrize("message", [
+    "I'm really scared", "I'm scared of her", "he keeps bullying me", "I'm scared and I need help",
+])
+def test_intensifier_or_second_term_fires(detector, message):
+    assert detector.scan(message).detected
+
+
+def test_intensifier_alone_does_not_fire(detector):
+    result = detector.scan("I really really want a puppy every day")
+    assert not result.detected and result.score == 0
+
+
+@pytest.mark.parametrize("message, detected", [
+    ("abuſe", True), ("ＡＢＵＳＥ", True), ("Someone HURT ME", True), ("I am ſcared", False),
+])
+def test_unicode_case_variants_are_matched_not_raised(detector, message, detected):
+    assert detector.scan(message).detected == detected
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from lazy import LazyResource, ResourceFailed
+
+
+class FlakyFactory:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("vector store missing")
+        return "resource"
+
+
+def test_failed_build_is_not_retried_until_backoff_passes(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("lazy.time.monotonic", lambda: now[0])
+    factory = FlakyFactory(failures=2)
+    resource = LazyResource("vectorstore", factory, retry_seconds=30, max_retry_seconds=600)
+
+    with pytest.raises(OSError):
+        resource.get()
+    for _ in range(5):
+        with pytest.raises(ResourceFailed):
+            resource.get()
+        with pytest.raises(ResourceFailed):
+            asyncio.run(resource.aget())
+    assert factory.calls == 1
+
+    # Retried after the backoff, which doubles on a second failure
+    now[0] += 30
+    with pytest.raises(OSError):
+        resource.get()
+    now[0] += 59
+    with pytest.raises(ResourceFailed):
+        resource.get()
+    now[0] += 1
+    assert resource.get() == "resource"
+    assert factory.calls == 3
+    assert resource.status()["state"] == "ready"
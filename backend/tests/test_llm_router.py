@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from llm_router import CircuitBreaker, ModelUnavailable, ProviderRouter
+
+
+class FakeModel:
+    """Replies with text after a delay, or raises; streams chunks with a gap between them"""
+
+    def __init__(self, text="ok", delay=0.0, error=None, chunk_gaps=()):
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.chunk_gaps = chunk_gaps
+        self.calls = 0
+        self.closed = False
+
+    async def ainvoke(self, prompt_value):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.text
+
+    async def astream(self, prompt_value):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+            yield self.text
+            for gap in self.chunk_gaps:
+                await asyncio.sleep(gap)
+                yield self.text
+        finally:
+            self.closed = True
+
+
+def router_for(models, **kwargs):
+    def getter(model):
+        async def get():
+            return model
+        return get
+    return ProviderRouter({name: getter(model) for name, model in models.items()}, **kwargs)
+
+
+def collect(router):
+    async def run():
+        return [chunk async for chunk in router.astream("prompt")]
+    return asyncio.run(run())
+
+
+def test_fails_over_when_primary_errors():
+    router = router_for({"primary": FakeModel(error=RuntimeError("down")), "fallback": FakeModel("fallback")})
+    assert asyncio.run(router.ainvoke("prompt")) == "fallback"
+    assert router.failovers == 1
+    assert router.breakers["primary"].failures == 1
+
+
+def test_hedges_slow_primary():
+    primary, fallback = FakeModel("slow", delay=1.0), FakeModel("fast")
+    router = router_for({"primary": primary, "fallback": fallback}, hedge_after_ms=20)
+    assert asyncio.run(router.ainvoke("prompt")) == "fast"
+    assert router.hedges == 1 and router.hedge_wins == 1
+    # The abandoned call proves nothing about the primary
+    assert router.breakers["primary"].state == "closed"
+
+
+def test_open_breaker_skips_provider():
+    breakers = {"primary": CircuitBreaker(failure_threshold=1, reset_timeout=60), "fallback": CircuitBreaker()}
+    primary = FakeModel(error=RuntimeError("down"))
+    router = router_for({"primary": primary, "fallback": FakeModel("fallback")}, breakers=breakers)
+    asyncio.run(router.ainvoke("prompt"))
+    asyncio.run(router.ainvoke("prompt"))
+    assert primary.calls == 1
+    assert breakers["primary"].state == "open"
+
+
+def test_deadline_raises_model_unavailable():
+    router = router_for({"primary": FakeModel(delay=1.0)}, timeout=0.05)
+    with pytest.raises(ModelUnavailable):
+        asyncio.run(router.ainvoke("prompt"))
+    assert router.deadline_exceeded == 1
+
+
+def test_stream_failover_before_first_chunk():
+    router = router_for({"primary": FakeModel(error=RuntimeError("down")), "fallback": FakeModel("hi", chunk_gaps=[0])})
+    assert collect(router) == ["hi", "hi"]
+
+
+def test_stream_stalling_mid_stream_ends_and_trips_breaker():
+    model = FakeModel("hi", chunk_gaps=[0, 5.0])
+    breakers = {"primary": CircuitBreaker(failure_threshold=1)}
+    router = router_for({"primary": model}, breakers=breakers, stream_idle_timeout=0.05)
+    chunks = []
+
+    async def run():
+        async for chunk in router.astream("prompt"):
+            chunks.append(chunk)
+
+    with pytest.raises(ModelUnavailable):
+        asyncio.run(run())
+    assert chunks == ["hi", "hi"]
+    assert model.closed
+    assert router.stream_stalls == 1
+    assert breakers["primary"].state == "open"
+
+
+def test_stream_total_deadline():
+    model = FakeModel("hi", chunk_gaps=[0.03] * 100)
+    router = router_for({"primary": model}, stream_idle_timeout=1, stream_timeout=0.2)
+    with pytest.raises(ModelUnavailable):
+        collect(router)
+    assert model.closed
+    assert router.stream_stalls == 1
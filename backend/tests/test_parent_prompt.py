@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+ai_integration = pytest.importorskip("ai_integration")
+from langchain_core.documents import Document
+
+
+class BracesRetriever:
+    """Retriever whose only chunk is full of template braces"""
+
+    def lexical(self, message):
+        return []
+
+    def decisive(self, hits):
+        return True
+
+    async def asearch(self, query_vector, lexical_hits, k=None):
+        return [Document(page_content='Use JSON like {"safe": true} or a {placeholder}. Never {{ close }.',
+                         metadata={"source": "braces.html"})]
+
+
+async def fake_retriever():
+    return BracesRetriever()
+
+
+def test_braces_in_message_and_context_are_kept_as_text(monkeypatch):
+    monkeypatch.setattr(ai_integration, "get_retriever_or_none", fake_retriever)
+    monkeypatch.setattr(ai_integration.parent_cache, "store", lambda *args: None)
+    message = "What does {age} mean in {\"json\"}? }"
+
+    async def run():
+        _, _, cached, inputs = await ai_integration.prepare_parent_chat(message)
+        assert cached is None
+        prompt_value = await ai_integration.parent_prompt.ainvoke(inputs)
+        reply = await ai_integration.parent_chatbot(message)
+        return prompt_value.to_messages(), reply
+
+    (system, human), reply = asyncio.run(run())
+    assert human.content == message
+    assert '{"safe": true} or a {placeholder}' in system.content
+    assert reply
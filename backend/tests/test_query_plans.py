@@ -0,0 +1,156 @@
+"""Hot queries must be served from an index.
+
+Runs the database.py functions on the request path against a migrated
+database, records every statement they execute, and checks each one with
+EXPLAIN QUERY PLAN: none may do a full SCAN of a hot table.
+"""
+import sqlite3
+
+import pytest
+
+import chat_archive
+import db_pool
+
+# Tables that grow with users and traffic; lessons is a small fixed catalog
+HOT_TABLES = {
+    "users", "parent_child_links", "emergency_alerts", "chat_history", "student_progress",
+    "progress_summary", "conversation_summaries", "questions",
+}
+ALIASES = {"u": "users", "pcl": "parent_child_links", "ea": "emergency_alerts", "ps": "progress_summary",
+           "sp": "student_progress", "l": "lessons"}
+
+
+def seed(database):
+    parent = database.create_user("parent@example.com", "hash", "parent", "Parent")
+    child = database.create_user("child@example.com", "hash", "child", "Child", 8)
+    database.link_parent_child(parent, child)
+    database.create_emergency_alert(child, "help")
+    database.save_chat_messages([("c1", child, "hi", "hello", 0, "2020-01-01T00:00:00")])
+    lesson = database.get_all_lessons()[0]['id']
+    database.track_student_progress(child, lesson, 3, 4, True)
+    return parent, child, lesson
+
+
+def run_hot_paths(database, parent, child, lesson):
+    database.invalidate_user(parent, "parent@example.com")
+    database.get_user_by_email("parent@example.com")
+    database.get_user_by_id(parent)
+    database.get_parent_of_child(child)
+    database.is_child_linked(parent, child)
+    database.get_children_of_parent(parent)
+    database.get_parent_dashboard(parent)
+    database.get_alerts_for_parent(parent, limit=50)
+    database.get_alerts_for_parent(parent, since="2000-01-01", before=("2100-01-01", "z"), limit=50)
+    database.mark_alerts_seen(parent, child)
+    database.get_chat_history(child, limit=50)
+    database.get_chat_history(child, before=("2100-01-01", "z"), limit=50)
+    database.get_chat_turns_after(child, after=("2000-01-01", "a"), limit=12, newest_first=False)
+    database.save_conversation_summary(child, "summary", ("2020-01-01T00:00:00", "c1"))
+    database.get_conversation_summary(child)
+    database.track_student_progress(child, lesson, 4, 4, True)
+    database.get_student_progress(child, lesson)
+    database.get_progress_by_user(child)
+    database.get_progress_summary(child)
+    database.get_questions_by_lesson(lesson)
+    chat_archive.archive_batch("2000-01-01T00:00:00")
+
+
+def full_scans(db, sql):
+    plan = [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    scans = []
+    for line in plan:
+        # "SCAN x USING INDEX" / "USING COVERING INDEX" walks an index, not the table
+        if line.startswith("SCAN ") and "INDEX" not in line:
+            table = line.split()[1]
+            if ALIASES.get(table, table) in HOT_TABLES:
+                scans.append(line)
+    return scans
+
+
+def test_hot_queries_use_an_index(temp_db, monkeypatch):
+    parent, child, lesson = seed(temp_db)
+
+    statements = []
+    connect = db_pool.ConnectionPool._connect
+
+    def traced_connect(pool):
+        conn = connect(pool)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    temp_db.close_db_pool()
+    monkeypatch.setattr(db_pool.ConnectionPool, "_connect", traced_connect)
+    run_hot_paths(temp_db, parent, child, lesson)
+
+    queries = [sql for sql in statements if sql.lstrip().split()[0].upper() in ("SELECT", "UPDATE", "DELETE")]
+    assert len(queries) >= 20
+    db = sqlite3.connect(temp_db.DATABASE)
+    regressions = {sql: scans for sql in queries if (scans := full_scans(db, sql))}
+    db.close()
+    assert not regressions
+
+
+def test_failed_migration_step_rolls_back(temp_db, monkeypatch):
+    import migrations
+
+    version = max(step[0] for step in migrations.MIGRATIONS)
+
+    def half_applied(db):
+        db.execute("CREATE TABLE partial_step (id INTEGER)")
+        raise RuntimeError("step failed")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS",
+                        migrations.MIGRATIONS + [(version + 1, "failing step", half_applied)])
+    db = sqlite3.connect(temp_db.DATABASE)
+    try:
+        with pytest.raises(RuntimeError):
+            migrations.migrate(db)
+        assert migrations.current_version(db) == version
+        assert not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'partial_step'").fetchone()
+    finally:
+        db.close()
+
+
+def test_concurrent_migrations_apply_each_step_once(tmp_path, monkeypatch):
+    import threading
+
+    import migrations
+
+    path = str(tmp_path / "app.db")
+    started = threading.Barrier(2)
+    # Both workers read version 0 before either takes the write lock
+    read_version = migrations.current_version
+
+    def current_version(db):
+        version = read_version(db)
+        if not db.in_transaction:
+            try:
+                started.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+        return version
+
+    monkeypatch.setattr(migrations, "current_version", current_version)
+    results, errors = [], []
+
+    def worker():
+        db = sqlite3.connect(path, timeout=10)
+        try:
+            results.append(migrations.migrate(db))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latest = migrations.MIGRATIONS[-1][0]
+    assert not errors
+    assert results == [latest, latest]
+    db = sqlite3.connect(path)
+    assert db.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(migrations.MIGRATIONS)
+    db.close()
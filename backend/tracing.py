@@ -0,0 +1,401 @@
+"""Per-request tracing with timed spans.
+
+A sampled request gets a trace ID (returned in the X-Trace-Id response
+header) and a root span. Code on the request path opens child spans with
+span(name, **attributes): auth, each database call, query embedding,
+retrieval, prompt assembly, time to the model's first token and the whole
+generation. The current span is kept in a context variable, so tasks
+started from the request (streamed bodies, background folds) join its trace.
+
+Unsampled requests never create a span: TRACE_SAMPLE_RATE=0 (the default)
+costs one comparison per request and one context variable lookup per
+span() call. Finished spans are handed to a background thread that appends
+them to TRACE_FILE as JSON lines, or posts them in OTLP/HTTP JSON to
+TRACE_OTLP_ENDPOINT (TRACE_EXPORTER=otlp). When the export queue is full,
+spans are dropped rather than slowing requests.
+
+For local use without a collector:
+    python tracing.py collect --port 4318 --out traces.jsonl
+    python tracing.py summary traces.jsonl
+"""
+import argparse
+import contextvars
+import json
+import os
+import queue
+import random
+import secrets
+import statistics
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+import metrics
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+TRACE_FLUSH_MS = 1000
+TRACE_BATCH_SPANS = 512
+SERVICE_NAME = "safenet-backend"
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns",
+                 "error", "_started", "_previous")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._started = time.perf_counter_ns()
+        self._previous = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        exporter.export(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or self.start_ns + time.perf_counter_ns() - self._started) - self.start_ns) / 1e6
+
+    def __enter__(self):
+        self._previous = _current.get()
+        _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # set() rather than a reset token: an async generator may be closed from another context
+        _current.set(self._previous)
+        if exc is not None and not isinstance(exc, Exception):
+            # Cancelled (a lost hedge, a client gone away): not a failure
+            self.attributes["cancelled"] = True
+            exc = None
+        self.end(exc)
+        return False
+
+    def record(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span outside a sampled trace; every operation does nothing"""
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """A child of the current span, or a no-op outside a sampled trace"""
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def start_trace(name, sample_rate=None, **attributes):
+    """Root span of a new trace, or a no-op when the trace is not sampled"""
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return NOOP_SPAN
+    exporter.traces += 1
+    return Span(name, secrets.token_hex(16), None, attributes)
+
+
+def current_span():
+    """The innermost open span (a no-op outside a sampled trace)"""
+    current = _current.get()
+    return current if current is not None else NOOP_SPAN
+
+
+class TraceMiddleware:
+    """ASGI middleware opening a root span per sampled HTTP request.
+
+    The span stays open until the response body has been sent, so streamed
+    chat replies are covered up to their last token.
+    """
+
+    def __init__(self, app, sample_rate=None):
+        self.app = app
+        self.sample_rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.sample_rate <= 0:
+            return await self.app(scope, receive, send)
+        root = start_trace(f"{scope['method']} {scope['path']}", self.sample_rate,
+                           **{"http.method": scope["method"], "http.target": scope["path"]})
+        if root is NOOP_SPAN:
+            return await self.app(scope, receive, send)
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                root.set(**{"http.status_code": message["status"]})
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-trace-id", root.trace_id.encode())]}
+            await send(message)
+
+        with root:
+            await self.app(scope, receive, traced_send)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(records):
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest) for span records"""
+    spans = []
+    for record in records:
+        otlp = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 1 if record["parent_span_id"] else 2,  # internal / server
+            "startTimeUnixNano": str(record["start_time_unix_nano"]),
+            "endTimeUnixNano": str(record["end_time_unix_nano"]),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in record["attributes"].items()],
+            "status": {"code": 2, "message": record["error"]} if record["error"] else {"code": 1},
+        }
+        if record["parent_span_id"]:
+            otlp["parentSpanId"] = record["parent_span_id"]
+        spans.append(otlp)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "safenet.tracing"}, "spans": spans}],
+    }]}
+
+
+def records_from_otlp(payload):
+    """Span records from an OTLP/HTTP JSON body (the inverse of otlp_payload)"""
+    def value(v):
+        if "arrayValue" in v:
+            return [value(item) for item in v["arrayValue"].get("values", [])]
+        if "intValue" in v:
+            return int(v["intValue"])
+        return next(iter(v.values()), None)
+
+    for resource_spans in payload.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for otlp in scope_spans.get("spans", []):
+                start, end = int(otlp["startTimeUnixNano"]), int(otlp["endTimeUnixNano"])
+                status = otlp.get("status", {})
+                yield {
+                    "trace_id": otlp["traceId"],
+                    "span_id": otlp["spanId"],
+                    "parent_span_id": otlp.get("parentSpanId") or None,
+                    "name": otlp["name"],
+                    "start_time_unix_nano": start,
+                    "end_time_unix_nano": end,
+                    "duration_ms": round((end - start) / 1e6, 3),
+                    "status": "error" if status.get("code") == 2 else "ok",
+                    "error": status.get("message"),
+                    "attributes": {a["key"]: value(a["value"]) for a in otlp.get("attributes", [])},
+                }
+
+
+class SpanExporter:
+    """Background thread writing finished spans in batches"""
+
+    def __init__(self, kind=TRACE_EXPORTER, path=TRACE_FILE, endpoint=TRACE_OTLP_ENDPOINT,
+                 max_size=TRACE_QUEUE_SIZE):
+        if kind not in ("jsonl", "otlp"):
+            raise ValueError(f"Invalid TRACE_EXPORTER: {kind!r}")
+        self.kind = kind
+        self.path = path
+        self.endpoint = endpoint
+        self._queue = queue.Queue(maxsize=max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.traces = 0
+        self.exported = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    def export(self, finished):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + TRACE_FLUSH_MS / 1000
+            while len(batch) < TRACE_BATCH_SPANS:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._write([s.record() for s in batch if s is not None])
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, records):
+        if not records:
+            return
+        try:
+            if self.kind == "otlp":
+                request = urllib.request.Request(
+                    self.endpoint, data=json.dumps(otlp_payload(records)).encode("utf-8"),
+                    headers={"Content-Type": "application/json"}, method="POST")
+                urllib.request.urlopen(request, timeout=5).close()
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(record, default=str) + "\n" for record in records)
+            self.exported += len(records)
+        except Exception as e:
+            self.export_errors += 1
+            print(f"Warning: Could not export {len(records)} trace spans: {e}")
+
+    def stop(self):
+        """Write out queued spans and stop the exporter thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def stats(self):
+        return {
+            "sample_rate": TRACE_SAMPLE_RATE,
+            "exporter": self.kind,
+            "traces": self.traces,
+            "spans_exported": self.exported,
+            "spans_dropped": self.dropped,
+            "export_errors": self.export_errors,
+            "queue_depth": self._queue.qsize(),
+        }
+
+
+exporter = SpanExporter()
+metrics.register("tracing", exporter.stats)
+
+
+def collect(args):
+    """Minimal OTLP/HTTP JSON collector appending received spans to a JSON-lines file"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                records = list(records_from_otlp(payload))
+            except (ValueError, KeyError) as e:
+                self.send_error(400, str(e))
+                return
+            with lock, open(args.out, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"Collecting OTLP spans on http://127.0.0.1:{args.port}/v1/traces into {args.out}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def summary(args):
+    """Per-span-name latency from a JSON-lines trace file"""
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    traces = set()
+    with open(args.path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            traces.add(record["trace_id"])
+            durations[record["name"]].append(record["duration_ms"])
+            errors[record["name"]] += record["status"] == "error"
+    print(f"{len(traces)} traces")
+    for name, samples in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        samples.sort()
+        print(f"{name:<36} n={len(samples):<6} p50={statistics.median(samples):.2f}ms "
+              f"p95={samples[min(len(samples) - 1, int(len(samples) * 0.95))]:.2f}ms "
+              f"max={samples[-1]:.2f}ms errors={errors[name]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trace collection and summaries")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("collect", help="Receive OTLP/HTTP JSON spans and append them to a file")
+    p.add_argument("--port", type=int, default=4318)
+    p.add_argument("--out", default=TRACE_FILE)
+    p.set_defaults(func=collect)
+    p = sub.add_parser("summary", help="Latency per span name from a JSON-lines trace file")
+    p.add_argument("path", nargs="?", default=TRACE_FILE)
+    p.set_defaults(func=summary)
+    parsed = parser.parse_args()
+    parsed.func(parsed)